@@ -22,7 +22,7 @@ done
 # 3) make graphs: all experiments has been run and log files have been flushed so build graphs like in graph-builder.sh
 logfiles=(*_lat.*.log)
 echo "Find MAX and MAX_IOPS in '${logfiles[@]}'..."
-maxes=$(python3 ../src/max_value_finder.py -f ${logfiles[@]} -m both 2>&1)
+maxes=$(python3 ../src/max_value_finder.py -f ${logfiles[@]} -m both)
 max=$(echo $maxes | cut -f1 -d " ")
 iops=$(echo $maxes | cut -f2 -d " ")
 echo "MAX=$max"
@@ -31,10 +31,11 @@ if [ -z "${JOBNAME}" ]; then
 fi
 
 # go through log files and run FioLogparser and FioHistogram on each
+# --cache lets every run after the first one memory-map the parsed columns instead of parsing the log again
 shopt -s nullglob
 files=(${HOME_FOLDER}/*${JOBNAME}_${METRIC}.*.log)
 echo "Find MAX and MAX_IOPS in '${files[@]}'..."
-maxes=$(python3 ../src/max_value_finder.py -f ${files[@]} -m both 2>&1)
+maxes=$(python3 ../src/max_value_finder.py -f ${files[@]} -m both --cache)
 max=$(echo $maxes | cut -f1 -d " ")
 iops=$(echo $maxes | cut -f2 -d " ")
 echo "MAX=$max"
@@ -43,11 +44,11 @@ for f in ${files[@]}
 do 
     name="$(basename -s .log $f)"
     echo "Processing $name..."
-    python3 ../src/fiologparser.py -m io_count -lt "${METRIC}" --title "IOPS distribution over the course of experiment" -o "$name-iocount.png" -f "$f" -aa "$iops"
-    python3 ../src/fiologparser.py -m ios -lt "${METRIC}" --title "Measurement value per I/O" -o "$name-ios-ylog.png" -f "$f" -ylog -aa "$max"
-    python3 ../src/fiologparser.py -m mixed -lt "${METRIC}" --title "Measurement value per I/O" -o "$name-mixed-ylog.png" -f "$f" -ylog -aa "$max"
-    python3 ../src/fiohistogram.py -lt "${METRIC}" -f "$f" -m simple -o "$name-hist.png" --bins 100 --min 0 --max "$max"
-    python3 ../src/fiohistogram.py -lt "${METRIC}" -f "$f" -m simple -o "$name-hist-ylog.png" --bins 100 --ylog --min 0 --max "$max"
+    python3 ../src/fiologparser.py -m io_count -lt "${METRIC}" --title "IOPS distribution over the course of experiment" -o "$name-iocount.png" -f "$f" -aa "$iops" --cache
+    python3 ../src/fiologparser.py -m ios -lt "${METRIC}" --title "Measurement value per I/O" -o "$name-ios-ylog.png" -f "$f" -ylog -aa "$max" --cache
+    python3 ../src/fiologparser.py -m mixed -lt "${METRIC}" --title "Measurement value per I/O" -o "$name-mixed-ylog.png" -f "$f" -ylog -aa "$max" --cache
+    python3 ../src/fiohistogram.py -lt "${METRIC}" -f "$f" -m simple -o "$name-hist.png" --bins 100 --min 0 --max "$max" --cache
+    python3 ../src/fiohistogram.py -lt "${METRIC}" -f "$f" -m simple -o "$name-hist-ylog.png" --bins 100 --ylog --min 0 --max "$max" --cache
     echo -e "$name complete\n"
 done
 echo "done"
\ No newline at end of file
@@ -34,7 +34,7 @@ fi
 shopt -s nullglob
 files=(${HOME_FOLDER}/*${JOBNAME}_${METRIC}.*.log)
 echo "Find MAX in '${files[@]}'..."
-maxes=$(python3 ../src/max_value_finder.py -f ${files[@]} -m max 2>&1)
+maxes=$(python3 ../src/max_value_finder.py -f ${files[@]} -m max)
 max=$(echo $maxes | cut -f1 -d " ")
 echo "MAX=$max"
 for f in ${files[@]}
@@ -0,0 +1,179 @@
+import numpy as np
+
+from fio_utils import parallel_imap
+
+###################################################
+# AGGREGATING FILES
+###################################################
+# '-agg' aligns the logs of several files (e.g. the per-job logs of a 'numjobs=64' run) on absolute time buckets instead
+# of on their position in each log. every file is streamed into its own buckets with np.bincount and merged into the
+# total as soon as it is done, so the memory of an aggregation depends on the number of buckets and not on the number
+# of files or entries
+class TimeBuckets:
+    """
+    Counts and value sums of log entries in absolute time buckets of width msec, where bucket b holds the entries with a
+    timestamp in (b*width, (b+1)*width] like the windows of 'ElapsedWindows'. Blocks of entries and the buckets of other
+    files can be added in any order.
+    """
+    def __init__(self, width):
+        self.width = int(width)
+        self.size = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0)
+
+    def reserve(self, buckets):
+        if buckets > len(self.counts):
+            size = max(buckets, 2 * len(self.counts))
+            (counts, sums) = (np.zeros(size, dtype=np.int64), np.zeros(size))
+            counts[:self.size] = self.counts[:self.size]
+            sums[:self.size] = self.sums[:self.size]
+            (self.counts, self.sums) = (counts, sums)
+        self.size = max(self.size, buckets)
+
+    def add(self, times, values=None):
+        """
+        Adds a block of entries given by their timestamps and, if the values are summed, their measurement values.
+        """
+        if len(times) == 0:
+            return self
+        buckets = np.maximum(np.asarray(times, dtype=np.int64) - 1, 0) // self.width
+        n = int(buckets.max()) + 1
+        self.reserve(n)
+        self.counts[:n] += np.bincount(buckets, minlength=n)
+        if values is not None:
+            self.sums[:n] += np.bincount(buckets, weights=values, minlength=n)
+        return self
+
+    def merge(self, other):
+        """
+        Adds the buckets of other, which must have the same width, e.g. those of another file.
+        """
+        n = other.size
+        self.reserve(n)
+        self.counts[:n] += other.counts[:n]
+        self.sums[:n] += other.sums[:n]
+        return self
+
+    def averaged(self):
+        """
+        Returns buckets that hold the mean value of every bucket of these as a single entry, so merging the averaged buckets
+        of several files sums the means of the files (e.g. the bandwidth of every job to the bandwidth of the run).
+        """
+        averaged = TimeBuckets(self.width)
+        averaged.size = self.size
+        averaged.counts = (self.counts[:self.size] > 0).astype(np.int64)
+        averaged.sums = self.sums[:self.size] / np.maximum(self.counts[:self.size], 1)
+        return averaged
+
+    def used(self):
+        return self.counts[:self.size] > 0
+
+    def means(self):
+        """
+        Returns the mean value of every bucket, 0 for empty buckets.
+        """
+        return self.sums[:self.size] / np.maximum(self.counts[:self.size], 1)
+
+    def ends(self):
+        """
+        Returns the end of every bucket in msec.
+        """
+        return (np.arange(self.size, dtype=np.int64) + 1) * self.width
+
+class IoWindows:
+    """
+    Counts IOs in buckets of step msec, per direction with split, and returns the IOPS of windows of window msec that start
+    every step msec, so the windows overlap (slide) when step is smaller than window. Bucket b holds the IOs with a timestamp
+    in (b*step, (b+1)*step] like 'TimeBuckets', so seconds without IOs count 0. Blocks of entries and the windows of other
+    files can be added in any order.
+    """
+    def __init__(self, window=1000, step=None, split=False):
+        self.window = int(window)
+        self.step = int(step) if step else self.window
+        if self.window <= 0 or self.step <= 0 or self.window % self.step != 0:
+            raise ValueError("the window of {} msec is not a multiple of the step of {} msec".format(self.window, self.step))
+        self.split = split
+        self.size = 0
+        # one row of buckets per direction (read, write, trim) with split, else a single row
+        self.counts = np.zeros((3 if split else 1, 0), dtype=np.int64)
+
+    def reserve(self, buckets):
+        if buckets > self.counts.shape[1]:
+            counts = np.zeros((len(self.counts), max(buckets, 2 * self.counts.shape[1])), dtype=np.int64)
+            counts[:, :self.size] = self.counts[:, :self.size]
+            self.counts = counts
+        self.size = max(self.size, buckets)
+
+    def add(self, times, directions=None):
+        """
+        Adds a block of IOs given by their timestamps and, with split, their directions.
+        """
+        if len(times) == 0:
+            return self
+        # the timestamps keep their compact type, a timestamp of 0 belongs to the first bucket
+        buckets = np.maximum(np.asarray(times) - 1, 0) // self.step
+        n = int(buckets.max()) + 1
+        self.reserve(n)
+        if self.split:
+            groups = len(self.counts)
+            counts = np.bincount(buckets.astype(np.int64) * groups + directions, minlength=n * groups)
+            self.counts[:, :n] += counts.reshape(n, groups).T
+        else:
+            self.counts[0, :n] += np.bincount(buckets, minlength=n)
+        return self
+
+    def merge(self, other):
+        """
+        Adds the buckets of other, which must count the same windows, e.g. those of another file.
+        """
+        n = other.size
+        self.reserve(n)
+        self.counts[:, :n] += other.counts[:, :n]
+        return self
+
+    def window_counts(self):
+        """
+        Returns the number of IOs in every window as a [rows, windows] array, where window w covers (w*step, w*step+window].
+        A log shorter than a window still yields a single window.
+        """
+        if self.size == 0:
+            return np.zeros((len(self.counts), 0), dtype=np.int64)
+        k = self.window // self.step
+        size = max(self.size, k)
+        sums = np.zeros((len(self.counts), size + 1), dtype=np.int64)
+        np.cumsum(self.counts[:, :self.size], axis=1, out=sums[:, 1:self.size + 1])
+        sums[:, self.size + 1:] = sums[:, self.size:self.size + 1]
+        return sums[:, k:] - sums[:, :size + 1 - k]
+
+    def result(self):
+        """
+        Returns (y_values, x_values) where y_values are the IOPS of every window, as a [directions, windows] array with split,
+        and x_values the end of every window in sec.
+        """
+        counts = self.window_counts()
+        y_values = counts * (1000 / self.window)
+        x_values = (np.arange(counts.shape[1]) * self.step + self.window) / 1000
+        return (y_values if self.split else y_values[0], x_values)
+
+    def max_iops(self):
+        """
+        Returns the highest IOPS of any window, counting all directions together, or 0 without IOs.
+        """
+        counts = self.window_counts().sum(axis=0)
+        return counts.max() * 1000 / self.window if counts.size > 0 else 0
+
+def merge_all(parts):
+    """
+    Merges the buckets (or any parts with a 'merge' method) into the first of them and returns it, or None without parts.
+    """
+    total = None
+    for part in parts:
+        total = part if total is None else total.merge(part)
+    return total
+
+def aggregate_files(args, load):
+    """
+    Calls load(args, filepath) for every file of the run, in parallel with '--jobs', and merges the buckets it returns
+    in file order as they are ready.
+    """
+    return merge_all(parallel_imap(load, [(args, f) for f in args.files], args.jobs))
@@ -0,0 +1,96 @@
+import os
+import sys
+import re
+import glob
+import shutil
+
+import numpy as np
+
+from fio_records import LogRecords, compact_dtype, column_floor
+
+###################################################
+# COLUMN CACHE
+###################################################
+# parsed columns are stored next to the log in a folder '.<logname>.<size>-<mtime>.columns' so that
+# a changed log (new size or modification time) never matches an old cache. every column is its own
+# '<column>.npy' in the smallest type that fits it, so each can be memory-mapped and an offset column
+# does not widen the others
+CACHE_SUFFIX = ".columns"
+# caches of earlier versions stored all columns in a single '.<logname>.<size>-<mtime>.npy'
+STALE_SUFFIXES = [CACHE_SUFFIX, ".npy"]
+
+def cache_key(filepath):
+    """
+    Returns the key that identifies the current contents of the log file: its size and modification time.
+    """
+    stat = os.stat(filepath)
+    return "{}-{}".format(stat.st_size, stat.st_mtime_ns)
+
+CACHE_KEY = re.compile(r"^\d+-\d+$")
+
+def cache_files(filepath):
+    """
+    Returns the caches of every version of the log file. The caches of other logs whose name starts with the
+    name of this one (e.g. 'a.log.gz' for 'a.log') match the same glob and are left out by checking the key.
+    """
+    directory, name = os.path.split(os.path.abspath(filepath))
+    prefix = os.path.join(directory, "." + name + ".")
+    return [path for suffix in STALE_SUFFIXES for path in glob.glob(glob.escape(prefix) + "*" + suffix)
+            if CACHE_KEY.match(path[len(prefix):-len(suffix)])]
+
+def remove_cache(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def column_path(path, column):
+    return os.path.join(path, "{}.npy".format(column))
+
+def cache_path(filepath):
+    directory, name = os.path.split(os.path.abspath(filepath))
+    return os.path.join(directory, ".{}.{}{}".format(name, cache_key(filepath), CACHE_SUFFIX))
+
+def load_cache(filepath, verbose=False):
+    """
+    Returns the parsed columns of the log file as 'LogRecords' memory-mapped from its cache or None if no valid cache exists.
+    """
+    path = cache_path(filepath)
+    if not os.path.isdir(path):
+        return None
+    try:
+        columns = len(os.listdir(path))
+        log = LogRecords([np.load(column_path(path, c), mmap_mode="r") for c in range(columns)])
+    except (OSError, ValueError) as e:
+        print("warning: could not read cache '{}' ({}), parsing log instead".format(path, e), file=sys.stderr)
+        return None
+    if verbose:
+        print("Loaded {} entries from cache '{}'".format(log.shape[1], path))
+    return log
+
+def store_cache(filepath, log, verbose=False):
+    """
+    Writes the parsed columns of the log file to its cache and removes the caches of older versions of the log.
+    """
+    path = cache_path(filepath)
+    for stale in cache_files(filepath):
+        if stale != path:
+            remove_cache(stale)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        # the columns are written to a temporary folder that is renamed once complete, so a cache is never read half-written
+        os.makedirs(tmp_path, exist_ok=True)
+        for c in range(log.shape[0]):
+            column = np.asarray(log[c])
+            np.save(column_path(tmp_path, c), column.astype(compact_dtype(column, column_floor(c)), copy=False))
+        if os.path.isdir(path):
+            # another run has stored the same version of the log in the meantime
+            remove_cache(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except OSError as e:
+        print("warning: could not write cache '{}' ({})".format(path, e), file=sys.stderr)
+        remove_cache(tmp_path)
+        return
+    if verbose:
+        print("Stored {} entries in cache '{}'".format(log.shape[1], path))
@@ -0,0 +1,142 @@
+import io
+import os
+import bz2
+import glob
+import gzip
+import lzma
+import zlib
+import struct
+import contextlib
+
+###################################################
+# COMPRESSED LOGS
+###################################################
+# compressed logs are recognized by their suffix and decompressed while reading, never to a temporary file.
+# '.fz' is fio's own log compression (log_compression / log_store_compressed): a sequence of independent zlib streams
+COMPRESSED_SUFFIXES = [".gz", ".bz2", ".xz", ".fz"]
+GZIP_MAGIC = b"\x1f\x8b\x08"
+# gzip header of a BGZF block (as written by bgzip): FEXTRA with a 'BC' subfield holding the compressed block size - 1
+BGZF_HEADER = struct.Struct("<4sI2sH2sHH")
+
+def compression(filepath):
+    """
+    Returns the compression suffix of the log file or None for an uncompressed log.
+    """
+    for suffix in COMPRESSED_SUFFIXES:
+        if filepath.endswith(suffix):
+            return suffix
+    return None
+
+def strip_compression(filename):
+    suffix = compression(filename)
+    return filename[:-len(suffix)] if suffix else filename
+
+def find_logs(folder, pattern):
+    """
+    Returns the sorted filepaths in folder that match the pattern, uncompressed or with a compression suffix.
+    """
+    base = os.path.join(glob.escape(folder), pattern)
+    files = set(glob.glob(base))
+    for suffix in COMPRESSED_SUFFIXES:
+        files.update(glob.glob(base + suffix))
+    return sorted(files)
+
+class ZlibStreams(io.RawIOBase):
+    """
+    Reads the decompressed contents of a file holding one or more concatenated zlib (or gzip) streams, such as fio's '.fz' logs.
+    """
+    def __init__(self, raw, read_size=1 << 20):
+        self.raw = raw
+        self.read_size = read_size
+        self.decompressor = zlib.decompressobj(47) # 32 + 15: detect zlib or gzip header
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            if self.decompressor.eof:
+                rest = self.decompressor.unused_data
+                self.decompressor = zlib.decompressobj(47)
+                if rest:
+                    self.pending = self.decompressor.decompress(rest)
+                    continue
+            data = self.raw.read(self.read_size)
+            if not data:
+                self.pending = self.decompressor.flush()
+                if not self.pending:
+                    return 0
+                break
+            self.pending = self.decompressor.decompress(data)
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+@contextlib.contextmanager
+def open_log(filepath):
+    """
+    Opens the log file for binary reading and yields (stream, raw) where stream reads the decompressed log
+    and raw is the underlying file whose position tells how far into the (compressed) file reading got.
+    """
+    suffix = compression(filepath)
+    with open(filepath, "rb") as raw:
+        if suffix == ".gz":
+            stream = gzip.GzipFile(fileobj=raw, mode="rb")
+        elif suffix == ".bz2":
+            stream = bz2.BZ2File(raw, mode="rb")
+        elif suffix == ".xz":
+            stream = lzma.LZMAFile(raw, mode="rb")
+        elif suffix == ".fz":
+            stream = io.BufferedReader(ZlibStreams(raw))
+        else:
+            yield (raw, raw)
+            return
+        with stream:
+            yield (stream, raw)
+
+def bgzf_blocks(filepath):
+    """
+    Returns the byte offsets of all gzip members of a BGZF compressed log (and its size as last offset), or None if the
+    log is not BGZF. The members are found from their headers alone, so they can be decompressed independently.
+    """
+    if compression(filepath) != ".gz":
+        return None
+    size = os.path.getsize(filepath)
+    offsets = [0]
+    with open(filepath, "rb") as f:
+        while offsets[-1] < size:
+            f.seek(offsets[-1])
+            header = f.read(BGZF_HEADER.size)
+            if len(header) < BGZF_HEADER.size:
+                return None
+            (magic, _, _, xlen, subfield, length, bsize) = BGZF_HEADER.unpack(header)
+            if magic[:3] != GZIP_MAGIC or not magic[3] & 4 or subfield != b"BC" or length != 2:
+                return None
+            offsets.append(offsets[-1] + bsize + 1)
+    return offsets if offsets[-1] == size else None
+
+def split_members(filepath, parts):
+    """
+    Splits a BGZF compressed log into at most the given number of byte ranges of whole gzip members, or returns None
+    if the log is not BGZF compressed.
+    """
+    offsets = bgzf_blocks(filepath)
+    if offsets is None or len(offsets) < 3:
+        return None
+    size = offsets[-1]
+    cuts = [0]
+    for offset in offsets[1:-1]:
+        if offset >= size * len(cuts) / parts:
+            cuts.append(offset)
+    cuts.append(size)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+def inflate_range(filepath, start, end):
+    """
+    Returns the decompressed contents of the gzip members between the byte offsets start and end.
+    """
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        return gzip.decompress(f.read(end - start))
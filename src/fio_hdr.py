@@ -0,0 +1,235 @@
+import numpy as np
+
+###################################################
+# LOG-BUCKETED HISTOGRAM
+###################################################
+# values below 2^bits get a bucket of their own, larger values share buckets whose width doubles with every power of two,
+# i.e. every power of two range is split into 2^(bits-1) buckets. a value is off from its bucket bounds by less than 2^-(bits-1)
+# relative to the value, so the bucket count only grows with the log of the largest value and not with the number of samples
+DEFAULT_BITS = 8
+HDR_SUFFIX = ".hdr.npz"
+
+class LogHistogram:
+    """
+    Streaming histogram of non-negative integer values (e.g. nsec latencies) in log-linear buckets with bounded relative error.
+    Histograms with the same number of bits can be merged, so chunks and files can be counted separately and combined.
+    """
+    def __init__(self, bits=DEFAULT_BITS):
+        self.bits = int(bits)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.min = None
+        self.max = None
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def bucket_index(self, values):
+        """
+        Returns the bucket of every value, see the comment above the class.
+        """
+        values = np.maximum(np.asarray(values, dtype=np.int64), 0)
+        shifts = np.maximum(np.frexp(values.astype(float))[1] - self.bits, 0).astype(np.int64)
+        # float rounding can overestimate the bit length of huge values by one, so recheck the shifted mantissa
+        shifts += (values >> shifts) >> self.bits
+        mantissas = values >> shifts
+        half = 1 << (self.bits - 1)
+        return np.where(shifts == 0, values, (1 << self.bits) + (shifts - 1) * half + mantissas - half)
+
+    def bucket_bounds(self, indices=None):
+        """
+        Returns the (lower, upper) bounds of the given buckets (all buckets by default), where a bucket holds lower <= value < upper.
+        """
+        if indices is None:
+            indices = np.arange(len(self.counts))
+        indices = np.asarray(indices, dtype=np.int64)
+        half = 1 << (self.bits - 1)
+        offsets = np.maximum(indices - (1 << self.bits), 0)
+        shifts = np.where(indices < (1 << self.bits), 0, offsets // half + 1)
+        lowers = np.where(indices < (1 << self.bits), indices, (offsets % half + half) << shifts)
+        return (lowers, lowers + (np.int64(1) << shifts))
+
+    def reserve(self, buckets):
+        if buckets <= len(self.counts):
+            return
+        grown = np.zeros(max(buckets, 2 * len(self.counts)), dtype=np.int64)
+        grown[:len(self.counts)] = self.counts
+        self.counts = grown
+
+    def add(self, values):
+        """
+        Counts a block of values.
+        """
+        if len(values) == 0:
+            return self
+        indices = self.bucket_index(values)
+        counts = np.bincount(indices)
+        self.reserve(len(counts))
+        self.counts[:len(counts)] += counts
+        (low, high) = (int(np.min(values)), int(np.max(values)))
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of another histogram with the same number of bits to this one.
+        """
+        if other.bits != self.bits:
+            raise ValueError("cannot merge histograms with {} and {} bits".format(self.bits, other.bits))
+        self.reserve(len(other.counts))
+        self.counts[:len(other.counts)] += other.counts
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def cumulative_at(self, edges):
+        """
+        Returns the number of values below each edge, interpolated linearly within the buckets.
+        """
+        (lowers, uppers) = self.bucket_bounds()
+        used = np.flatnonzero(self.counts)
+        if len(used) == 0:
+            return np.zeros(len(edges))
+        # cumulative counts at the bucket bounds, the buckets are ordered and do not overlap
+        points = np.empty(2 * len(used))
+        points[0::2] = lowers[used]
+        points[1::2] = uppers[used]
+        cumulative = np.empty(2 * len(used))
+        cumulative[1::2] = np.cumsum(self.counts[used])
+        cumulative[0::2] = cumulative[1::2] - self.counts[used]
+        return np.interp(edges, points, cumulative)
+
+    def rebin(self, edges):
+        """
+        Returns the number of values between consecutive edges, spreading every bucket evenly over its range.
+        """
+        return np.diff(self.cumulative_at(np.asarray(edges, dtype=float)))
+
+    def quantile(self, q):
+        """
+        Returns the value below which the fraction q of the values lie, interpolated within its bucket.
+        """
+        total = self.total
+        if total == 0:
+            return 0.0
+        (lowers, uppers) = self.bucket_bounds()
+        cumulative = np.cumsum(self.counts)
+        rank = min(max(q, 0.0), 1.0) * total
+        i = min(int(np.searchsorted(cumulative, rank, side="left")), len(cumulative) - 1)
+        before = cumulative[i] - self.counts[i]
+        fraction = (rank - before) / self.counts[i] if self.counts[i] else 0.0
+        value = lowers[i] + fraction * (uppers[i] - lowers[i])
+        return float(min(max(value, self.min), self.max))
+
+    def save(self, filepath):
+        used = np.flatnonzero(self.counts)
+        np.savez(filepath, bits=self.bits, buckets=used, counts=self.counts[used],
+                 limits=np.array([self.min if self.min is not None else -1, self.max if self.max is not None else -1]))
+
+def load_histogram(filepath):
+    """
+    Loads a histogram written by 'LogHistogram.save'.
+    """
+    with np.load(filepath) as data:
+        histogram = LogHistogram(int(data["bits"]))
+        buckets = data["buckets"]
+        if len(buckets):
+            histogram.reserve(int(buckets[-1]) + 1)
+            histogram.counts[buckets] = data["counts"]
+            (histogram.min, histogram.max) = (int(data["limits"][0]), int(data["limits"][1]))
+    return histogram
+
+def histogram_from_counts(counts, bits):
+    """
+    Returns a histogram holding the given bucket counts. Min and max are the bounds of the outermost non-empty buckets.
+    """
+    histogram = LogHistogram(bits)
+    histogram.counts = np.asarray(counts, dtype=np.int64).copy()
+    used = np.flatnonzero(histogram.counts)
+    if len(used):
+        (lowers, uppers) = histogram.bucket_bounds(used[[0, -1]])
+        (histogram.min, histogram.max) = (int(lowers[0]), int(uppers[1]) - 1)
+    return histogram
+
+class WindowHistograms:
+    """
+    A log-bucketed histogram (see 'LogHistogram') per time window, for the percentiles of every window of a long log.
+    Only the (window, bucket) pairs that hold values are stored, as sorted keys with their counts, so memory grows with the
+    number of distinct pairs and not with the number of values. Blocks are counted with np.unique and merged into the keys
+    once the pending blocks hold as many pairs as the keys, which keeps the merging linear in the number of pairs.
+    """
+    def __init__(self, bits=DEFAULT_BITS):
+        self.layout = LogHistogram(bits)
+        # an upper bound on the bucket index of any int64 value, so a key is window * buckets + bucket
+        self.buckets = (1 << bits) + (64 - bits) * (1 << (bits - 1))
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.pending = []
+        self.pending_size = 0
+
+    def add(self, windows, values):
+        """
+        Counts a block of values, each in its window.
+        """
+        if len(values) == 0:
+            return self
+        keys = np.asarray(windows, dtype=np.int64) * self.buckets + self.layout.bucket_index(values)
+        self.pending.append(np.unique(keys, return_counts=True))
+        self.pending_size += len(self.pending[-1][0])
+        if self.pending_size >= max(len(self.keys), 1 << 16):
+            self.compact()
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of the windows of another instance with the same number of bits.
+        """
+        if other.layout.bits != self.layout.bits:
+            raise ValueError("cannot merge histograms with {} and {} bits".format(self.layout.bits, other.layout.bits))
+        other.compact()
+        self.pending.append((other.keys, other.counts))
+        self.pending_size += len(other.keys)
+        self.compact()
+        return self
+
+    def compact(self):
+        if not self.pending:
+            return
+        keys = np.concatenate([self.keys] + [p[0] for p in self.pending])
+        counts = np.concatenate([self.counts] + [p[1] for p in self.pending])
+        (self.keys, inverse) = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
+        self.pending = []
+        self.pending_size = 0
+
+    def quantiles(self, qs):
+        """
+        Returns (windows, values) where windows are the windows that hold values in ascending order and values is a
+        [len(qs), windows] array of the q-quantile of the values of each window. Like np.percentile the quantile lies between
+        the two closest ranked values, and the values of a bucket are taken as evenly spread over its range.
+        """
+        self.compact()
+        if len(self.keys) == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros((len(qs), 0)))
+        (windows, buckets) = np.divmod(self.keys, self.buckets)
+        starts = np.flatnonzero(np.concatenate([[True], windows[1:] != windows[:-1]]))
+        ends = np.append(starts[1:], len(windows)) - 1
+        cumulative = np.cumsum(self.counts)
+        before = cumulative[starts] - self.counts[starts]
+        totals = cumulative[ends] - before
+        (lowers, uppers) = self.layout.bucket_bounds(buckets)
+
+        def ranked(ranks):
+            # the value of the given ranks (counted from 0 over all windows), found in the pair whose counts hold the rank
+            i = np.clip(np.searchsorted(cumulative, ranks, side="right"), starts, ends)
+            fractions = np.clip((ranks - (cumulative[i] - self.counts[i]) + 0.5) / self.counts[i], 0, 1)
+            return lowers[i] + fractions * (uppers[i] - lowers[i])
+
+        values = np.empty((len(qs), len(starts)))
+        for (k, q) in enumerate(qs):
+            positions = before + min(max(q, 0.0), 1.0) * (totals - 1)
+            (below, above) = (ranked(np.floor(positions)), ranked(np.ceil(positions)))
+            values[k] = below + (positions - np.floor(positions)) * (above - below)
+        return (windows[starts], values)
@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import resource
+import threading
+import contextlib
+
+###################################################
+# INSTRUMENTATION
+###################################################
+# named phases (read, parse, load, aggregate, render, savefig) are recorded with their wall time, CPU time and peak memory
+# while a recorder is active, see 'instrumented'. without one 'phase' returns a null context so the instrumented code
+# costs nothing. phases nest: 'load' holds the 'read', 'parse' and 'aggregate' phases of the files it loads, and phases
+# run in worker processes only show up as the time their parent phase waited for the workers
+RECORDER = None
+
+def cpu_seconds():
+    """
+    Returns the CPU time of this process and its finished child processes (e.g. of a closed worker pool).
+    """
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """
+    Returns the peak resident set size in MiB of this process, or of its largest finished child process for RUSAGE_CHILDREN.
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+class PhaseRecorder:
+    """
+    Sums the wall time, CPU time and calls of every named phase. The peak RSS of a phase is the peak of the process
+    when the phase last ended and its growth is how much the phases of that name raised the peak.
+    """
+    def __init__(self):
+        self.phases = {}
+        self.stack = []
+        self.start_wall = time.perf_counter()
+        self.start_cpu = cpu_seconds()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        record = self.phases.get(name)
+        if record is None:
+            record = {"parent": self.stack[-1] if self.stack else None, "calls": 0, "wall_sec": 0.0, "cpu_sec": 0.0, "peak_rss_mb": 0.0, "rss_growth_mb": 0.0}
+            self.phases[name] = record
+        self.stack.append(name)
+        (wall, cpu, rss) = (time.perf_counter(), cpu_seconds(), peak_rss_mb())
+        try:
+            yield record
+        finally:
+            self.stack.pop()
+            record["calls"] += 1
+            record["wall_sec"] += time.perf_counter() - wall
+            record["cpu_sec"] += cpu_seconds() - cpu
+            record["peak_rss_mb"] = peak_rss_mb()
+            record["rss_growth_mb"] += record["peak_rss_mb"] - rss
+
+    def report(self):
+        return {"wall_sec": time.perf_counter() - self.start_wall, "cpu_sec": cpu_seconds() - self.start_cpu, "peak_rss_mb": peak_rss_mb(),
+                "children_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN), "phases": self.phases}
+
+    def depth(self, name):
+        parent = self.phases[name]["parent"]
+        return 0 if parent is None else self.depth(parent) + 1
+
+    def summary(self, out=sys.stdout):
+        report = self.report()
+        print("{:<16} {:>6} {:>10} {:>10} {:>12} {:>12}".format("phase", "calls", "wall sec", "cpu sec", "peak MiB", "growth MiB"), file=out)
+        for (name, record) in self.phases.items():
+            print("{:<16} {:>6} {:>10.3f} {:>10.3f} {:>12.1f} {:>12.1f}".format("  " * self.depth(name) + name, record["calls"], record["wall_sec"],
+                  record["cpu_sec"], record["peak_rss_mb"], record["rss_growth_mb"]), file=out)
+        print("{:<16} {:>6} {:>10.3f} {:>10.3f} {:>12.1f}".format("total", "", report["wall_sec"], report["cpu_sec"], report["peak_rss_mb"]), file=out)
+
+def phase(name):
+    """
+    Returns a context manager that records the enclosed code as the named phase, or a null context if no recorder is active
+    or name is None.
+    """
+    if RECORDER is None or name is None:
+        return contextlib.nullcontext()
+    return RECORDER.phase(name)
+
+def timed(name, process, *args):
+    """
+    Calls process with args as the named phase and returns its output.
+    """
+    with phase(name):
+        return process(*args)
+
+def iter_timed(name, iterable):
+    """
+    Yields the items of iterable where fetching every item, e.g. waiting for a worker pool, is recorded as the named phase.
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            item = next(iterator, None)
+        if item is None:
+            return
+        yield item
+
+@contextlib.contextmanager
+def instrumented(args):
+    """
+    Records the phases of the enclosed run if '--phases' is given and writes them as JSON to that filepath, and profiles
+    the run with cProfile if '--profile' is given, see 'add_instrument_arguments'.
+    """
+    global RECORDER
+    phases_path = getattr(args, "phases", None)
+    profile_path = getattr(args, "profile", None)
+    previous = RECORDER
+    if phases_path:
+        RECORDER = PhaseRecorder()
+    profiler = cProfile.Profile() if profile_path else None
+    try:
+        if profiler:
+            profiler.enable()
+        yield RECORDER
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            print("Saved profile to '{}'".format(profile_path))
+            if args.verbose:
+                pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(15)
+        if phases_path:
+            RECORDER.summary()
+            with open(phases_path, "w") as f:
+                json.dump(RECORDER.report(), f, indent=2)
+            print("Saved phases to '{}'".format(phases_path))
+        RECORDER = previous
+
+def add_instrument_arguments(parser):
+    """
+    Adds '--phases' and '--profile' to the argument parser of a tool.
+    """
+    parser.add_argument('--phases', help="record the wall time, CPU time and peak memory of every phase (read, parse, aggregate, render, savefig) "
+                        "and save them as JSON to this filepath")
+    parser.add_argument('--profile', help="profile the run with cProfile and save the stats to this filepath (see 'python3 -m pstats')")
+    return parser
+
+class Progress:
+    """
+    Prints the share of bytes read so far from a background thread every interval seconds while the reader only adds
+    the length of every parsed part, so reading does no reporting work. Used as a context manager around the read.
+    """
+    def __init__(self, size, enabled=True, interval=0.5):
+        self.size = max(size, 1)
+        self.enabled = enabled
+        self.interval = interval
+        self.bytes_read = 0
+        self.done = threading.Event()
+        self.thread = None
+        self.start_time = time.perf_counter()
+
+    def add(self, length):
+        self.bytes_read += length
+
+    def show(self, end="\r"):
+        print("Progress: {:.0f}% ({:.3f} sec)".format(min(self.bytes_read / self.size, 1) * 100, time.perf_counter() - self.start_time), end=end)
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            self.show()
+
+    def __enter__(self):
+        if self.enabled:
+            self.thread = threading.Thread(target=self.sample, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.thread:
+            self.done.set()
+            self.thread.join()
+            self.show(end="\n")
+        return False
@@ -0,0 +1,171 @@
+import numpy as np
+
+###################################################
+# BINNED KERNEL DENSITY ESTIMATION
+###################################################
+# the sample is linearly binned onto a fine grid and the grid counts are convolved with the
+# kernel through an FFT, so the cost depends on the grid size and not on the number of samples
+GRID_SIZE = 1 << 14
+BANDWIDTH_RULES = ["scott", "silverman", "sj", "cv"]
+# the sklearn kernels: the bandwidth is the standard deviation of the gaussian kernel and the half width of the others
+KERNELS = {
+    "gaussian": (lambda u: np.exp(-0.5 * u * u) / np.sqrt(2 * np.pi), 4.0),
+    "tophat": (lambda u: np.where(np.abs(u) < 1, 0.5, 0.0), 1.0),
+    "epanechnikov": (lambda u: np.where(np.abs(u) < 1, 0.75 * (1 - u * u), 0.0), 1.0),
+}
+
+def linear_binning(sample, lo, hi, size):
+    """
+    Spreads every sample over the two nearest of size grid points from lo to hi in proportion to its distance to them.
+    Returns the grid counts, which sum to the number of samples inside [lo, hi].
+    """
+    delta = (hi - lo) / (size - 1)
+    position = (np.asarray(sample, dtype=float) - lo) / delta
+    position = position[(position >= 0) & (position <= size - 1)]
+    left = np.minimum(np.floor(position).astype(np.int64), size - 2)
+    weight = position - left
+    counts = np.bincount(left, weights=1 - weight, minlength=size)
+    counts += np.bincount(left + 1, weights=weight, minlength=size)
+    return counts
+
+def convolve(counts, weights):
+    """
+    Linear (not circular) convolution of the grid counts with a symmetric kernel given by its weights at grid offsets 0..L.
+    """
+    size = len(counts)
+    reach = len(weights) - 1
+    n = 1 << (size + 2 * reach - 1).bit_length()
+    kernel = np.zeros(n)
+    kernel[:reach + 1] = weights
+    if reach > 0:
+        kernel[-reach:] = weights[:0:-1]
+    return np.fft.irfft(np.fft.rfft(counts, n) * np.fft.rfft(kernel, n), n)[:size]
+
+def kernel_weights(kernel, bw, delta, size):
+    """
+    Returns the kernel scaled to the bandwidth at the grid offsets 0..L, where L covers the kernel support (or the grid).
+    """
+    (function, support) = KERNELS[kernel]
+    reach = min(int(np.ceil(support * bw / delta)), size - 1)
+    return function(np.arange(reach + 1) * delta / bw) / bw
+
+def binned_density(counts, delta, kernel, bw):
+    """
+    Returns the density on the grid for the binned counts, normalized by the number of binned samples.
+    """
+    density = convolve(counts, kernel_weights(kernel, bw, delta, len(counts))) / max(counts.sum(), 1)
+    return np.maximum(density, 0)
+
+def spread(sample):
+    """
+    Returns the robust spread min(std, IQR/1.34) used by the rule-of-thumb bandwidths.
+    """
+    std = np.std(sample)
+    (q1, q3) = np.percentile(sample, [25, 75])
+    iqr = (q3 - q1) / 1.34
+    return min(std, iqr) if iqr > 0 else std
+
+def scott_bandwidth(sample):
+    return 1.059 * np.std(sample) * len(sample) ** (-1 / 5)
+
+def silverman_bandwidth(sample):
+    return 0.9 * spread(sample) * len(sample) ** (-1 / 5)
+
+def gaussian_functional(counts, delta, g, r):
+    """
+    Binned estimate of the density functional psi_r = E[f^(r)(X)] with a gaussian kernel of bandwidth g, for r = 4 or 6.
+    """
+    n = counts.sum()
+    reach = min(int(np.ceil(6 * g / delta)), len(counts) - 1)
+    u = np.arange(reach + 1) * delta / g
+    phi = np.exp(-0.5 * u * u) / np.sqrt(2 * np.pi)
+    if r == 4:
+        derivative = (u ** 4 - 6 * u ** 2 + 3) * phi
+    else:
+        derivative = (u ** 6 - 15 * u ** 4 + 45 * u ** 2 - 15) * phi
+    return np.dot(counts, convolve(counts, derivative)) / (n * n * g ** (r + 1))
+
+def sheather_jones_bandwidth(sample, counts, delta):
+    """
+    The Sheather-Jones 'solve-the-equation' plug-in bandwidth for a gaussian kernel, using binned estimates of the
+    density functionals. Raises ValueError if the equation has no solution near the rule-of-thumb bandwidth.
+    """
+    n = counts.sum()
+    (q1, q3) = np.percentile(sample, [25, 75])
+    iqr = q3 - q1 if q3 > q1 else np.std(sample) * 1.349
+    if iqr <= 0:
+        raise ValueError("sample has no spread")
+    # normal-reference pilot bandwidths for the fourth and sixth derivative functionals
+    sd = gaussian_functional(counts, delta, 0.920 * iqr * n ** (-1 / 7), 4)
+    td = -gaussian_functional(counts, delta, 0.912 * iqr * n ** (-1 / 9), 6)
+    if sd <= 0 or td <= 0:
+        raise ValueError("pilot estimates are not positive")
+
+    def equation(h):
+        g = 1.357 * (sd / td) ** (1 / 7) * h ** (5 / 7)
+        psi4 = gaussian_functional(counts, delta, g, 4)
+        return (1 / (2 * np.sqrt(np.pi) * psi4 * n)) ** (1 / 5) - h
+
+    start = silverman_bandwidth(sample)
+    (low, high) = (max(start / 50, delta / 2), start * 10)
+    if equation(low) * equation(high) > 0:
+        raise ValueError("no root in [{:.4g}, {:.4g}]".format(low, high))
+    # scipy is only imported when needed as it takes longer to import than the rest of fiohistogram
+    from scipy.optimize import brentq
+    return brentq(equation, low, high, xtol=delta / 10)
+
+def cv_bandwidth(sample, counts, delta, kernel, candidates=40):
+    """
+    Least-squares cross-validation over log-spaced bandwidths around the Silverman bandwidth, evaluated on the binned
+    counts so every candidate costs one FFT convolution. The criterion is the integrated squared density minus twice the
+    mean leave-one-out density at the samples.
+    """
+    n = counts.sum()
+    start = silverman_bandwidth(sample)
+    best = (np.inf, start)
+    for bw in start * np.logspace(-1.5, 0.5, candidates):
+        if bw < delta / 2:
+            continue
+        weights = kernel_weights(kernel, bw, delta, len(counts))
+        smoothed = convolve(counts, weights)
+        integrated = np.sum((smoothed / n) ** 2) * delta
+        leave_one_out = (np.dot(counts, smoothed) - n * weights[0]) / (n * (n - 1))
+        score = integrated - 2 * leave_one_out
+        if score < best[0]:
+            best = (score, bw)
+    return best[1]
+
+def select_bandwidth(rule, sample, counts, delta, kernel):
+    """
+    Returns the bandwidth chosen by the rule, see 'BANDWIDTH_RULES'. Falls back to Silverman if Sheather-Jones fails.
+    """
+    if rule == "scott":
+        return scott_bandwidth(sample)
+    elif rule == "sj":
+        try:
+            return sheather_jones_bandwidth(sample, counts, delta)
+        except ValueError as e:
+            print("warning: Sheather-Jones bandwidth failed ({}), using Silverman instead".format(e))
+            return silverman_bandwidth(sample)
+    elif rule == "cv":
+        return cv_bandwidth(sample, counts, delta, kernel)
+    return silverman_bandwidth(sample)
+
+def fft_kde(sample, lo, hi, kernel="gaussian", bw=None, rule="sj", size=GRID_SIZE):
+    """
+    Estimates the density of the sample on a grid of size points spanning the sample and [lo, hi].
+    The bandwidth is bw if given, otherwise chosen by the rule. Returns (grid, density, bw).
+    """
+    sample = np.asarray(sample, dtype=float)
+    grid_lo = min(lo, sample.min())
+    grid_hi = max(hi, sample.max())
+    padding = (grid_hi - grid_lo) * 0.05 if grid_hi > grid_lo else 1.0
+    (grid_lo, grid_hi) = (grid_lo - padding, grid_hi + padding)
+    grid = np.linspace(grid_lo, grid_hi, size)
+    delta = grid[1] - grid[0]
+    counts = linear_binning(sample, grid_lo, grid_hi, size)
+    if not bw:
+        bw = select_bandwidth(rule, sample, counts, delta, kernel)
+    if not bw > 0:
+        bw = delta
+    return (grid, binned_density(counts, delta, kernel, bw), bw)
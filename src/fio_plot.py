@@ -0,0 +1,71 @@
+import numpy as np
+from matplotlib import colors
+
+###################################################
+# PLOT HELPERS
+###################################################
+def pixel_width(fig):
+    """
+    Returns the width of the figure in pixels when saved.
+    """
+    return int(fig.get_size_inches()[0] * fig.dpi)
+
+def decimate_minmax(x_values, y_values, target):
+    """
+    Reduces a series to roughly target points by splitting it into target/2 consecutive columns
+    and keeping the lowest and the highest point of every column (in their original order), so
+    spikes and outliers stay visible. NaN values are dropped. Returns (x_values, y_values).
+    """
+    keep = ~np.isnan(y_values)
+    if not np.all(keep):
+        (x_values, y_values) = (x_values[keep], y_values[keep])
+    n = len(y_values)
+    columns = max(int(target) // 2, 1)
+    if n <= 2 * columns:
+        return (x_values, y_values)
+    size = int(np.ceil(n / columns))
+    # pad with the last value so every column has the same size; picks in the padding are clipped back to the last point
+    padded = np.pad(y_values, (0, columns * size - n), mode="edge").reshape(columns, size)
+    offsets = np.arange(columns) * size
+    lows = offsets + np.argmin(padded, axis=1)
+    highs = offsets + np.argmax(padded, axis=1)
+    picks = np.unique(np.minimum(np.concatenate([[0, n - 1], lows, highs]), n - 1))
+    return (x_values[picks], y_values[picks])
+
+def decimate(args, fig, x_values, y_values, label):
+    """
+    Decimates the series with 'decimate_minmax' if '--decimate' is given, targeting '--target_points' points
+    or twice the pixel width of the figure, and reports how much the series was reduced.
+    """
+    if not args.decimate:
+        return (x_values, y_values)
+    target = args.target_points if args.target_points else 2 * pixel_width(fig)
+    n = int(np.count_nonzero(~np.isnan(y_values)))
+    (x_values, y_values) = decimate_minmax(x_values, y_values, target)
+    print("Decimated '{}' from {} to {} points ({:.1f}x reduction)".format(label, n, len(y_values), n / max(len(y_values), 1)))
+    return (x_values, y_values)
+
+def density(args, fig, ax, x_values, y_values, label):
+    """
+    Bins the points into a 2D count grid of about one cell per pixel of the axes and draws the grid as a single image,
+    so drawing time and memory depend on the size of the graph and not on the number of points.
+    The y-axis bins are logarithmic with '-ylog' and the colors are logarithmic with '--density_log'.
+    The label names the series on the color bar since a density grid has no legend entry.
+    """
+    keep = ~np.isnan(y_values)
+    (x_values, y_values) = (x_values[keep], y_values[keep])
+    extent = ax.get_window_extent()
+    columns = max(int(extent.width), 1)
+    rows = max(int(extent.height), 1)
+    x_edges = np.linspace(0, max(len(keep), 1), columns + 1) if len(x_values) == 0 else np.linspace(x_values.min(), x_values.max() + 1, columns + 1)
+    top = args.axisalign if args.axisalign else (y_values.max() if len(y_values) > 0 else 1)
+    if args.logscale_y:
+        y_edges = np.logspace(0, np.log10(max(top, 1) * 1.0001), rows + 1)
+    else:
+        y_edges = np.linspace(0, top * 1.0001, rows + 1)
+    (counts, x_edges, y_edges) = np.histogram2d(x_values, y_values, bins=[x_edges, y_edges])
+    counts = np.ma.masked_equal(counts.T, 0)
+    norm = colors.LogNorm(vmin=1, vmax=max(counts.max(), 1)) if args.density_log else None
+    mesh = ax.pcolormesh(x_edges, y_edges, counts, norm=norm, cmap="viridis", rasterized=True)
+    fig.colorbar(mesh, ax=ax, label="IOs per bin ({})".format(label))
+    print("Binned {} points into a {}x{} density grid".format(len(y_values), columns, rows))
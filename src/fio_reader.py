@@ -0,0 +1,436 @@
+import os
+import multiprocessing
+
+import numpy as np
+
+from fio_cache import load_cache, store_cache
+from fio_summary import LogSummary, summarizes
+from fio_seek import load_seek_index, store_seek_index, byte_span, in_time_range
+from fio_compress import compression, open_log, split_members, inflate_range
+from fio_instrument import phase, timed, iter_timed, Progress
+from fio_records import LogRecords, ColumnBuffer, TIME, VALUE, DIRECTION, BLOCK_SIZE, OFFSET
+
+###################################################
+# LOG INGESTION
+###################################################
+HEAD_BYTES = 64 # a followed log whose first bytes change has been rewritten
+HEAD_SIZE = 1 << 20 # the start of a log that row estimates are taken from
+READ_SIZE = 1 << 22 # read 4 MiB of the file at a time, the text and parsed integers of a block are temporary copies
+SPLIT_SIZE = 1 << 24 # files are split into byte ranges for parallel parsing in multiples of 16 MiB
+CACHE_BLOCK_ROWS = 1 << 20 # rows per block when passing over a cached log
+# turn line breaks into field separators so a whole block parses as one flat sequence of integers
+SEPARATORS = bytes.maketrans(b"\n\r", b", ")
+
+def count_columns(line):
+    """
+    Returns the number of comma separated fields in a single log line.
+    An empty line counts as the four columns every fio log has.
+    """
+    return line.count(b",") + 1 if line.strip() else BLOCK_SIZE + 1
+
+def parse_block(block, columns):
+    """
+    Parses a block of complete log lines into an integer array of shape [rows, columns].
+    """
+    block = block.rstrip()
+    if not block:
+        return np.empty((0, columns), dtype=np.int64)
+    values = np.fromstring(block.translate(SEPARATORS), dtype=np.int64, sep=",")
+    if values.size % columns != 0:
+        raise ValueError("malformed log block: {} values cannot be split into rows of {} columns".format(values.size, columns))
+    return values.reshape(-1, columns)
+
+def iter_blocks(f, read_size=READ_SIZE, limit=None):
+    """
+    Reads an opened binary file in large blocks and yields blocks that only contain complete lines.
+    If limit is given then no more than limit bytes are read from the current position.
+    """
+    remainder = b""
+    while limit is None or limit > 0:
+        with phase("read"):
+            data = f.read(read_size if limit is None else min(read_size, limit))
+        if not data:
+            break
+        if limit is not None:
+            limit -= len(data)
+        data = remainder + data
+        cut = data.rfind(b"\n") + 1
+        remainder = data[cut:]
+        if cut > 0:
+            yield data[:cut]
+    if remainder.strip():
+        yield remainder
+
+def estimate_rows(length, rows, size):
+    """
+    Estimates the number of rows in a file of the given byte size from the rows found in its first length bytes.
+    """
+    return int(rows / max(length, 1) * size * 1.05) + 1
+
+def estimate_file_rows(filepath):
+    """
+    Estimates the number of rows of an uncompressed log from the line lengths at its start and end, or returns None for a compressed log.
+    """
+    if compression(filepath):
+        return None
+    size = os.path.getsize(filepath)
+    with open(filepath, "rb") as f:
+        # the lines get longer as the timestamps grow, so the end of the log is sampled too
+        sample = f.read(min(size, HEAD_SIZE))
+        if size > 2 * HEAD_SIZE:
+            f.seek(size - HEAD_SIZE)
+            sample += f.read()
+    return int(sample.count(b"\n") / len(sample) * size) if sample else 0
+
+def row_offset(filepath, rows):
+    """
+    Returns the beginning of the line that likely follows the first rows lines of an uncompressed log, estimated from
+    the line lengths at its start, or the size of the log if the estimate lies beyond it.
+    """
+    size = os.path.getsize(filepath)
+    with open(filepath, "rb") as f:
+        head = f.read(min(size, HEAD_SIZE))
+        lines = head.count(b"\n")
+        offset = int(rows * len(head) / lines * 1.05) if lines else size
+        if offset >= size:
+            return size
+        f.seek(max(offset - 1, 0))
+        f.readline()
+        return f.tell()
+
+def parse_range(filepath, start, end, columns):
+    """
+    Parses the complete lines found between the byte offsets start and end of the log file.
+    """
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        return parse_block(f.read(end - start), columns)
+
+def parse_range_task(task):
+    return parse_range(*task)
+
+def split_ranges(filepath, parts, start=0, end=None):
+    """
+    Splits the log file, or its bytes from start to end where start is the beginning of a line, into at most the given
+    number of byte ranges that each start at the beginning of a line.
+    """
+    end = os.path.getsize(filepath) if end is None else end
+    offsets = [start]
+    with open(filepath, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(start + int((end - start) * i / parts) - 1, offsets[-1]))
+            f.readline()
+            offset = f.tell()
+            if offset >= end:
+                break
+            if offset > offsets[-1]:
+                offsets.append(offset)
+    offsets.append(end)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+def parse_member_range(filepath, start, end, columns):
+    """
+    Decompresses the gzip members between the byte offsets start and end and parses the complete lines found in them.
+    Members split lines at arbitrary bytes, so returns (head, rows, tail) where head is the data up to and including the
+    first line break, rows are the parsed lines after it and tail is the data after the last line break.
+    A range without a line break returns (data, None, None).
+    """
+    data = inflate_range(filepath, start, end)
+    first = data.find(b"\n") + 1
+    if first == 0:
+        return (data, None, None)
+    last = data.rfind(b"\n") + 1
+    return (data[:first], parse_block(data[first:last], columns), data[last:])
+
+def parse_member_range_task(task):
+    return parse_member_range(*task)
+
+def iter_parsed_members(filepath, ranges, columns, jobs):
+    """
+    Yields (byte length, [rows, columns] array) for byte ranges of gzip members decompressed and parsed by jobs worker processes,
+    joining the lines that are split between consecutive ranges.
+    """
+    carry = b""
+    length = 0
+    with multiprocessing.Pool(min(jobs, len(ranges))) as pool:
+        parts = pool.imap(parse_member_range_task, [(filepath, start, end, columns) for (start, end) in ranges])
+        for (start, end), (head, rows, tail) in zip(ranges, iter_timed("parse", parts)):
+            length += end - start
+            if rows is None:
+                carry += head
+                continue
+            yield (length, np.concatenate([timed("parse", parse_block, carry + head, columns), rows]))
+            (carry, length) = (tail, 0)
+    if carry.strip() or length:
+        yield (length, parse_block(carry, columns))
+
+def in_worker():
+    """
+    Returns True inside a pool worker process. Workers cannot start pools of their own and would interleave their progress lines.
+    """
+    return multiprocessing.current_process().daemon
+
+def iter_parsed(filepath, columns, jobs=1, span=None):
+    """
+    Yields (byte length, [rows, columns] array) for consecutive parts of the log file in file order.
+    With jobs > 1 a large file is split into line-aligned byte ranges that are parsed by that many worker processes.
+    Compressed logs are decompressed while reading, see 'fio_compress', where the byte length counts compressed bytes.
+    If span is given only the bytes from start to end of an uncompressed log are parsed, where start is the beginning of a line.
+    """
+    size = os.path.getsize(filepath)
+    (start, end) = span if span else (0, size)
+    if compression(filepath):
+        # gzip logs written by bgzip can be split into independent members, every other compressed log is a single stream
+        ranges = split_members(filepath, max(jobs * 4, size // (SPLIT_SIZE // 4))) if jobs > 1 and size >= SPLIT_SIZE // 2 and not in_worker() else None
+        if ranges:
+            yield from iter_parsed_members(filepath, ranges, columns, jobs)
+            return
+        with open_log(filepath) as (stream, raw):
+            position = 0
+            for block in iter_blocks(stream):
+                # progress and buffer estimates count the compressed bytes consumed
+                length = raw.tell() - position
+                position += length
+                yield (length, timed("parse", parse_block, block, columns))
+    elif jobs > 1 and end - start >= 2 * SPLIT_SIZE and not in_worker():
+        # keep ranges small enough that only a few of them are held in memory at a time
+        ranges = split_ranges(filepath, max(jobs * 4, (end - start) // (4 * SPLIT_SIZE)), start, end)
+        with multiprocessing.Pool(min(jobs, len(ranges))) as pool:
+            parts = pool.imap(parse_range_task, [(filepath, start, end, columns) for (start, end) in ranges])
+            for (start, end), part in zip(ranges, iter_timed("parse", parts)):
+                yield (end - start, part)
+    else:
+        with open(filepath, "rb") as f:
+            f.seek(start)
+            for block in iter_blocks(f, limit=end - start if span else None):
+                yield (len(block), timed("parse", parse_block, block, columns))
+
+def index_range(filepath, start, end, columns):
+    """
+    Returns the segments of the bytes from start to end of the log file as a [3, segments] array of their byte offsets and
+    their lowest and highest timestamps. Every block read by 'iter_blocks' is a segment.
+    """
+    segments = []
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        offset = start
+        for block in iter_blocks(f, limit=end - start):
+            times = parse_block(block, columns)[:, TIME]
+            if len(times) > 0:
+                segments.append((offset, times.min(), times.max()))
+            offset += len(block)
+    return np.array(segments, dtype=np.int64).reshape(-1, 3).T
+
+def index_range_task(task):
+    return index_range(*task)
+
+def build_seek_index(filepath, columns, jobs=1, verbose=False):
+    """
+    Builds and stores the seek index of the log file (see 'fio_seek'), parsing line-aligned byte ranges in parallel with jobs > 1.
+    Returns (offsets, firsts, lasts) like 'fio_seek.load_seek_index'.
+    """
+    size = os.path.getsize(filepath)
+    tasks = [(filepath, start, end, columns) for (start, end) in split_ranges(filepath, max(jobs * 4, size // (4 * SPLIT_SIZE)))]
+    with phase("index"):
+        if jobs > 1 and size >= 2 * SPLIT_SIZE and not in_worker():
+            with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+                parts = pool.map(index_range_task, tasks)
+        else:
+            parts = [index_range(*task) for task in tasks]
+    (offsets, firsts, lasts) = np.concatenate(parts, axis=1)
+    index = (np.append(offsets, size), firsts, lasts)
+    store_seek_index(filepath, *index, verbose=verbose)
+    return index
+
+def seek_span(filepath, columns, time_range, jobs=1, verbose=False):
+    """
+    Returns the byte range (start, end) of the log file that holds the entries of the time range, found with the seek index
+    stored next to the log, which is built first if it is missing or out of date. Returns None for a compressed log, which
+    cannot be read from an offset and is parsed in full.
+    """
+    if compression(filepath):
+        if verbose:
+            print("Compressed log '{}' has no seek index, parsing it in full".format(filepath))
+        return None
+    index = load_seek_index(filepath)
+    if index is None:
+        if verbose:
+            print("Building seek index of '{}'...".format(filepath))
+        index = build_seek_index(filepath, columns, jobs=jobs, verbose=verbose)
+    span = byte_span(index, time_range)
+    if verbose:
+        print("Reading bytes {}-{} of {} for the time range".format(span[0], span[1], index[0][-1]))
+    return span
+
+def select_time_range(values, time_range):
+    """
+    Returns the [rows, columns] entries within the time range, all of them without a time range.
+    """
+    if time_range is None:
+        return values
+    return values[in_time_range(values[:, TIME], time_range)]
+
+def read_column_count(filepath):
+    with open_log(filepath) as (f, raw):
+        return count_columns(f.readline())
+
+def read_columns(filepath, verbose=False, progress=True, max_rows=None, jobs=1, time_range=None):
+    """
+    Parses the log file at the given filepath into 'LogRecords' such that e.g. 'log[TIME]' holds the timestamps
+    and 'log[VALUE]' holds the measurement values of every entry, each column in the smallest type that fits it.
+    The file is read exactly once: the column buffers are sized from the byte length of the file and grown if needed.
+    Progress is printed from a background thread based on bytes read unless progress is False, see 'fio_instrument.Progress'.
+    With jobs > 1 a large file is split into line-aligned byte ranges that are parsed by that many worker processes
+    and put back together in file order, so every later pass sees the entries exactly as a serial read would.
+    With a time_range of (from_ms, to_ms) only the part of the file found by 'seek_span' is parsed and only the entries
+    logged within the time range are kept.
+    With max_rows only the first max_rows entries are kept. An uncompressed log is then only parsed up to the byte offset
+    estimated by 'row_offset' (with jobs) and read on from there one block at a time if that held fewer entries, while
+    the other logs are read one block at a time until max_rows entries are found.
+    """
+    columns = read_column_count(filepath)
+    span = seek_span(filepath, columns, time_range, jobs=jobs, verbose=verbose) if time_range else None
+    spans = [(span, jobs)]
+    if max_rows is not None and span is None:
+        if compression(filepath):
+            spans = [(None, 1)]
+        else:
+            (end, total) = (row_offset(filepath, max_rows), os.path.getsize(filepath))
+            spans = [((0, end), jobs), ((end, total), 1)]
+    size = spans[0][0][1] - spans[0][0][0] if spans[0][0] else os.path.getsize(filepath)
+
+    def parts():
+        for (part, part_jobs) in spans:
+            if part is None or part[1] > part[0]:
+                yield from iter_parsed(filepath, columns, jobs=part_jobs, span=part)
+
+    buffers = None
+    k = 0
+    with Progress(size, progress and not in_worker()) as report:
+        for (length, values) in parts():
+            values = select_time_range(values, time_range)
+            if max_rows is not None:
+                values = values[:max_rows - k]
+            if buffers is None:
+                buffers = [ColumnBuffer(c, estimate_rows(length, len(values), size)) for c in range(columns)]
+            for (c, buffer) in enumerate(buffers):
+                buffer.append(values[:, c])
+            k += len(values)
+            report.add(length)
+            if max_rows is not None and k >= max_rows:
+                break
+    if buffers is None:
+        buffers = [ColumnBuffer(c, 0) for c in range(columns)]
+    if verbose:
+        print("Parsed {} entries with {} columns each".format(k, columns))
+    return LogRecords([buffer.finish(k) for buffer in buffers])
+
+def load_columns(filepath, verbose=False, progress=True, cache=False, jobs=1, time_range=None, summary=True, max_rows=None):
+    """
+    Returns the parsed columns of the log file, see 'read_columns' (also for jobs).
+    With cache enabled the columns are memory-mapped from a cache file stored next to the log
+    and the cache file is written after parsing if it is missing or out of date.
+    The summary of the log (see 'fio_summary') is stored too if it is missing or out of date, unless summary is disabled
+    or the file is not a plain fio log (e.g. a histogram log).
+    With a time_range of (from_ms, to_ms) only the entries logged within it are returned, see 'read_columns'. A cached log
+    is then sliced from the cache, while a log without a valid cache is read in part and neither cached nor summarized.
+    The same holds for max_rows, which only returns the first max_rows entries.
+    """
+    log = load_cache(filepath, verbose=verbose) if cache else None
+    if log is not None:
+        if time_range:
+            log = log[:, in_time_range(log[TIME], time_range)]
+        if max_rows is not None:
+            log = log[:, :max_rows]
+        if time_range or max_rows is not None:
+            return log
+    elif time_range or max_rows is not None:
+        return read_columns(filepath, verbose=verbose, progress=progress, jobs=jobs, time_range=time_range, max_rows=max_rows)
+    else:
+        log = read_columns(filepath, verbose=verbose, progress=progress, jobs=jobs)
+        if cache:
+            store_cache(filepath, log, verbose=verbose)
+    if summary and summarizes(filepath, log.shape[0]):
+        timed("summary", LogSummary().add, log).store(filepath, verbose=verbose)
+    return log
+
+def iter_columns(filepath, verbose=False, progress=True, cache=False, jobs=1, time_range=None, summary=True):
+    """
+    Yields the parsed columns of the log file as consecutive [columns, rows] blocks in file order
+    so that a pass over the log only holds a block at a time instead of the whole log.
+    A complete pass stores the summary of the log if it is missing or out of date and summary is enabled, see 'load_columns'.
+    With cache enabled the blocks are sliced from the memory-mapped cache file; note that writing
+    a missing cache file requires the whole log to be parsed into memory once.
+    With a time_range of (from_ms, to_ms) only the entries logged within it are yielded, see 'read_columns'.
+    """
+    if cache:
+        log = load_columns(filepath, verbose=verbose, progress=progress, cache=cache, jobs=jobs, time_range=time_range, summary=summary)
+        for start in range(0, log.shape[1], CACHE_BLOCK_ROWS):
+            yield log[:, start:start+CACHE_BLOCK_ROWS]
+        return
+    columns = read_column_count(filepath)
+    span = seek_span(filepath, columns, time_range, jobs=jobs, verbose=verbose) if time_range else None
+    collector = LogSummary() if summary and time_range is None and summarizes(filepath, columns) else None
+    k = 0
+    with Progress(span[1] - span[0] if span else os.path.getsize(filepath), progress and not in_worker()) as report:
+        for (length, values) in iter_parsed(filepath, columns, jobs=jobs, span=span):
+            values = select_time_range(values, time_range)
+            k += len(values)
+            report.add(length)
+            if collector is not None:
+                timed("summary", collector.add, values.T)
+            yield values.T
+    if verbose:
+        print("Parsed {} entries with {} columns each".format(k, columns))
+    if collector is not None:
+        collector.store(filepath, verbose=verbose)
+
+class LogFollower:
+    """
+    Follows a log file that is still being written: every call to 'poll' parses only the bytes appended since the last call.
+    A partial last line is kept until the rest of it has been written. A log that is rewritten (e.g. by a new fio run) is
+    followed from its start again, see 'restarted'. A rewrite is noticed when the log shrinks, is replaced by another file
+    (device and inode) or its first bytes change, so a new log that has already grown past the old offset is noticed too.
+    """
+    def __init__(self, filepath):
+        if compression(filepath):
+            raise ValueError("cannot follow compressed log '{}'".format(filepath))
+        self.filepath = filepath
+        self.offset = 0
+        self.remainder = b""
+        self.columns = None
+        self.restarted = False
+        self.identity = None
+        self.head = b""
+
+    def poll(self, read_size=READ_SIZE):
+        """
+        Yields the complete entries appended since the last poll as [columns, rows] blocks.
+        'restarted' is set when the log was rewritten and is left for the caller to reset once it has reset its own state.
+        """
+        if not os.path.isfile(self.filepath):
+            return
+        with open(self.filepath, "rb") as f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            identity = (stat.st_dev, stat.st_ino)
+            if self.offset and (identity != self.identity or size < self.offset or f.read(len(self.head)) != self.head):
+                (self.offset, self.remainder, self.columns, self.head, self.restarted) = (0, b"", None, b"", True)
+            self.identity = identity
+            f.seek(self.offset)
+            while self.offset < size:
+                data = f.read(min(read_size, size - self.offset))
+                if not data:
+                    break
+                self.offset += len(data)
+                data = self.remainder + data
+                cut = data.rfind(b"\n") + 1
+                self.remainder = data[cut:]
+                if cut == 0:
+                    continue
+                if self.columns is None:
+                    self.columns = count_columns(data[:data.find(b"\n")])
+                yield parse_block(data[:cut], self.columns).T
+            if len(self.head) < HEAD_BYTES:
+                f.seek(0)
+                self.head = f.read(min(self.offset, HEAD_BYTES))
@@ -0,0 +1,128 @@
+import numpy as np
+
+###################################################
+# COMPACT LOG RECORDS
+###################################################
+# a parsed log keeps every column as its own integer array of the smallest type that fits its values, instead of a single
+# int64 [columns, rows] array: timestamps, values and block sizes usually fit into 4 bytes and directions into 1 byte.
+# values stay raw integers (nsec, KiB/sec or IOPS) and are only divided by 1000 when a graph needs them
+# column positions of a fio log entry: 'time, value, direction, bs[, offset]'
+TIME = 0
+VALUE = 1
+DIRECTION = 2
+BLOCK_SIZE = 3
+OFFSET = 4
+# directions as logged by fio
+READ = 0
+WRITE = 1
+TRIM = 2
+DIRECTION_NAMES = ["read", "write", "trim"]
+
+def direction_name(direction):
+    """
+    Returns the name of a direction of the log, e.g. 'write' for 1, or 'dir<n>' for a direction fio does not log.
+    """
+    return DIRECTION_NAMES[direction] if 0 <= direction < len(DIRECTION_NAMES) else "dir{}".format(direction)
+
+SIGNED_TYPES = [np.dtype(t) for t in (np.int8, np.int16, np.int32, np.int64)]
+
+def compact_dtype(values, smallest=np.int32):
+    """
+    Returns the smallest signed integer type, but no smaller than smallest, that can hold every value. Types below 32 bit are
+    only used where a column is never used in arithmetic (e.g. directions), as they overflow easily.
+    """
+    if values.size == 0:
+        return np.dtype(smallest)
+    (low, high) = (int(values.min()), int(values.max()))
+    for dtype in SIGNED_TYPES:
+        if dtype.itemsize >= np.dtype(smallest).itemsize and np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return dtype
+    return SIGNED_TYPES[-1]
+
+def column_floor(column):
+    return np.int8 if column == DIRECTION else np.int32
+
+def scaled(values):
+    """
+    Returns the raw values divided by 1000: nsec -> usec, KiB/sec -> MiB/sec or IOPS -> kIOPS. Called when a graph is drawn.
+    """
+    return values / 1000
+
+def direction_index(directions, direction):
+    """
+    Returns the row numbers of the entries of the direction, which select the entries from every column by index.
+    """
+    rows = len(directions)
+    return np.arange(rows, dtype=np.int32 if rows < 2**31 else np.int64)[directions == direction]
+
+class LogRecords:
+    """
+    The parsed columns of a log, see the comment above. 'log[TIME]' returns the raw column and 'log[:, start:end]' the records
+    of a range of rows (as views), so the records can be used like the [columns, rows] array they replace.
+    """
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+    @classmethod
+    def from_array(cls, log):
+        """
+        Wraps a [columns, rows] array, e.g. a memory-mapped cache file, without copying it.
+        """
+        return cls([log[c] for c in range(log.shape[0])])
+
+    @property
+    def shape(self):
+        return (len(self.columns), len(self.columns[0]) if self.columns else 0)
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.columns)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            (columns, rows) = key
+            return LogRecords([c[rows] for c in self.columns[columns]])
+        if isinstance(key, slice):
+            # several columns as one array, e.g. the buckets of a histogram log
+            return np.stack(self.columns[key]) if self.columns[key] else np.empty((0, self.shape[1]), dtype=np.int64)
+        return self.columns[key]
+
+    def __array__(self, dtype=None, copy=None):
+        log = np.stack(self.columns) if self.columns else np.empty((0, 0), dtype=np.int64)
+        return log if dtype is None else log.astype(dtype)
+
+class ColumnBuffer:
+    """
+    Collects the blocks of one column while a log is parsed. The type of the buffer starts at the smallest type that fits
+    the first block and is widened if a later block does not fit, so the column never takes the int64 of the parser.
+    """
+    def __init__(self, column, capacity):
+        self.floor = column_floor(column)
+        self.values = None
+        self.capacity = capacity
+        self.size = 0
+
+    def append(self, block):
+        dtype = compact_dtype(block, self.floor)
+        if self.values is None:
+            self.values = np.empty(max(self.capacity, len(block)), dtype=dtype)
+        elif np.promote_types(dtype, self.values.dtype) != self.values.dtype:
+            self.values = self.values.astype(np.promote_types(dtype, self.values.dtype))
+        if self.size + len(block) > len(self.values):
+            grown = np.empty(max(self.size + len(block), int(len(self.values) * 1.25) + 1), dtype=self.values.dtype)
+            grown[:self.size] = self.values[:self.size]
+            self.values = grown
+        self.values[self.size:self.size + len(block)] = block
+        self.size += len(block)
+
+    def finish(self, rows):
+        """
+        Returns the first rows values, releasing the unused capacity of the buffer.
+        """
+        if self.values is None:
+            return np.empty(0, dtype=self.floor)
+        values = self.values
+        self.values = None
+        if len(values) > rows:
+            values.resize(rows, refcheck=False)
+        return values
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+
+###################################################
+# TIMESTAMP SEEK INDEX
+###################################################
+# '--from_ms' and '--to_ms' only read the part of a log that holds the requested time range. the seek index stored next
+# to the log as '.<logname>.seek.npz' splits the log into segments of complete lines and keeps the byte offset and the
+# lowest and highest timestamp of every segment, so a query reads the segments whose timestamps overlap the range and
+# drops the entries outside of it. the index is built by the first query on a log (see 'fio_reader.build_seek_index')
+# and holds the size and modification time of the log, so it is rebuilt once the log changes
+SEEK_SUFFIX = ".seek.npz"
+
+def seek_path(filepath):
+    directory, name = os.path.split(os.path.abspath(filepath))
+    return os.path.join(directory, ".{}{}".format(name, SEEK_SUFFIX))
+
+def load_seek_index(filepath):
+    """
+    Returns (offsets, firsts, lasts) of the segments of the log file or None if it has no index or the log has changed
+    since it was built. offsets holds the start of every segment followed by the size of the log.
+    """
+    try:
+        stat = os.stat(filepath)
+        with np.load(seek_path(filepath)) as index:
+            if int(index["size"]) != stat.st_size or int(index["mtime_ns"]) != stat.st_mtime_ns:
+                return None
+            return (index["offsets"], index["firsts"], index["lasts"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def store_seek_index(filepath, offsets, firsts, lasts, verbose=False):
+    """
+    Writes the seek index next to the log file. A log in a folder that cannot be written to is indexed again by every query.
+    """
+    stat = os.stat(filepath)
+    path = seek_path(filepath)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, size=stat.st_size, mtime_ns=stat.st_mtime_ns, offsets=offsets, firsts=firsts, lasts=lasts)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print("warning: could not write seek index '{}' ({})".format(path, e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    if verbose:
+        print("Stored seek index of {} segments in '{}'".format(len(firsts), path))
+
+def byte_span(index, time_range):
+    """
+    Returns the byte range (start, end) of the segments whose timestamps overlap the time range, or (0, 0) if none does.
+    """
+    (offsets, firsts, lasts) = index
+    (start, end) = time_range
+    overlaps = np.ones(len(firsts), dtype=bool)
+    if start is not None:
+        overlaps &= lasts >= start
+    if end is not None:
+        overlaps &= firsts <= end
+    selected = np.flatnonzero(overlaps)
+    if len(selected) == 0:
+        return (0, 0)
+    return (int(offsets[selected[0]]), int(offsets[selected[-1] + 1]))
+
+def in_time_range(times, time_range):
+    """
+    Returns the mask of the timestamps within the time range, which includes both of its ends.
+    """
+    (start, end) = time_range
+    mask = np.ones(len(times), dtype=bool)
+    if start is not None:
+        mask &= times >= start
+    if end is not None:
+        mask &= times <= end
+    return mask
+
+def time_range(args):
+    """
+    Returns (from_ms, to_ms) of '--from_ms' and '--to_ms', where an end that is not given is None, or None if neither is given.
+    """
+    (start, end) = (getattr(args, "from_ms", None), getattr(args, "to_ms", None))
+    if start is None and end is None:
+        return None
+    return (start, end)
+
+def add_time_range_arguments(parser):
+    """
+    Adds '--from_ms' and '--to_ms' to the argument parser of a tool.
+    """
+    parser.add_argument('--from_ms', type=int, help="only use the entries logged at or after this many msec. "
+                        "the first query on a log stores a seek index next to it so that later queries only read the requested part")
+    parser.add_argument('--to_ms', type=int, help="only use the entries logged at or before this many msec")
+    return parser
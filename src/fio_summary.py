@@ -0,0 +1,109 @@
+import os
+import json
+
+import numpy as np
+
+from fio_records import TIME, VALUE, DIRECTION, direction_name
+from fio_aggregate import IoWindows
+
+###################################################
+# LOG SUMMARIES
+###################################################
+# every full pass over a log stores a small summary next to it as '.<logname>.summary.json': the number of entries, the
+# time span, the min and max value per direction, the max IOPS per second and the size and modification time of the log.
+# a summary only counts while the log has the same size and modification time, so max_value_finder.py only rescans the
+# logs that are new or have changed
+SUMMARY_SUFFIX = ".summary.json"
+SUMMARY_VERSION = 1
+
+def summary_path(filepath):
+    directory, name = os.path.split(os.path.abspath(filepath))
+    return os.path.join(directory, ".{}{}".format(name, SUMMARY_SUFFIX))
+
+def load_summary(filepath):
+    """
+    Returns the summary of the log file or None if it has none or the log has changed since it was written.
+    """
+    try:
+        stat = os.stat(filepath)
+        with open(summary_path(filepath)) as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if summary.get("version") != SUMMARY_VERSION or summary.get("size") != stat.st_size or summary.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return summary
+
+SUMMARY_COLUMNS = (4, 5) # time, value, direction, block size and the optional offset of a plain fio log
+
+def summarizes(filepath, columns):
+    """
+    Returns whether a pass over the log file with the given number of columns should store its summary: only plain fio
+    logs are summarized (histogram logs hold other columns) and only if the summary is missing or out of date.
+    """
+    return columns in SUMMARY_COLUMNS and load_summary(filepath) is None
+
+class LogSummary:
+    """
+    Collects the summary of a log from its parsed blocks, which are added in any order.
+    """
+    def __init__(self):
+        self.rows = 0
+        self.first = None
+        self.last = None
+        self.directions = {}
+        self.iops = IoWindows(1000)
+
+    def add(self, log):
+        """
+        Adds a block of parsed columns.
+        """
+        if log.shape[1] == 0:
+            return self
+        (times, values) = (log[TIME], log[VALUE])
+        self.rows += len(times)
+        self.first = int(times.min()) if self.first is None else min(self.first, int(times.min()))
+        self.last = int(times.max()) if self.last is None else max(self.last, int(times.max()))
+        self.iops.add(times)
+        directions = log[DIRECTION] if log.shape[0] > DIRECTION else np.zeros(0)
+        (low, high) = (int(directions.min()), int(directions.max())) if len(directions) else (0, 0)
+        present = [low] if low == high else (np.flatnonzero(np.bincount(directions - low)) + low).tolist()
+        # most logs hold a single direction, which needs no mask
+        for direction in present:
+            selected = values if low == high else values[directions == direction]
+            name = direction_name(direction)
+            (rows, vmin, vmax) = self.directions.get(name, (0, None, None))
+            (bmin, bmax) = (int(selected.min()), int(selected.max()))
+            self.directions[name] = (rows + len(selected), bmin if vmin is None else min(vmin, bmin), bmax if vmax is None else max(vmax, bmax))
+        return self
+
+    def record(self, filepath):
+        """
+        Returns the summary of the log file as stored by 'store'.
+        """
+        stat = os.stat(filepath)
+        directions = {name: {"rows": rows, "min": vmin, "max": vmax} for (name, (rows, vmin, vmax)) in sorted(self.directions.items())}
+        return {"version": SUMMARY_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "rows": self.rows,
+                "first_ms": self.first, "last_ms": self.last, "directions": directions,
+                "min": min([d["min"] for d in directions.values()], default=None),
+                "max": max([d["max"] for d in directions.values()], default=None),
+                "max_iops": int(self.iops.max_iops())}
+
+    def store(self, filepath, verbose=False):
+        """
+        Writes the summary next to the log file. A log in a folder that cannot be written to just keeps no summary.
+        """
+        path = summary_path(filepath)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.record(filepath), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            if verbose:
+                print("warning: could not write summary '{}' ({})".format(path, e))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        if verbose:
+            print("Stored summary of {} entries in '{}'".format(self.rows, path))
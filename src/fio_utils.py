@@ -2,7 +2,9 @@ import os
 import sys
 import time
 import re
-import numpy as np
+import multiprocessing
+
+import fio_instrument
 
 def every_nth(x, n, off=0):
     return x % n == off
@@ -13,21 +15,52 @@ def not_same(x,y):
 def not_same_every_nth(x, y, n, off=0):
     return not_same(x,y) and every_nth(x,n,off=off)
 
-def time_it(process, verbose, *args, start_tag="", end_tag="Time"):
+def time_it(process, verbose, *args, start_tag="", end_tag="Time", phase=None):
     """
     Times a process given args in msec
     start_tag and end_tag is printed before and after the process is called
+    The call is also recorded as the given phase, see 'fio_instrument.phase'.
     """
-    if verbose:
-        if start_tag != "":
-            print(start_tag)
-        start_time = time.time_ns()
-        output = process(*args)
-        end_time = time.time_ns()
-        print("{}: {:.3f} sec".format(end_tag,(end_time - start_time) / 1E9))
-        return output
-    else:
-        return process(*args)
+    with fio_instrument.phase(phase):
+        if verbose:
+            if start_tag != "":
+                print(start_tag)
+            start_time = time.time_ns()
+            output = process(*args)
+            end_time = time.time_ns()
+            print("{}: {:.3f} sec".format(end_tag,(end_time - start_time) / 1E9))
+            return output
+        else:
+            return process(*args)
+
+def parallel_map(process, arguments, jobs=1):
+    """
+    Calls process once for every tuple of args in arguments and returns the outputs in the same order.
+    With jobs > 1 the calls are spread over a pool of that many worker processes, unless this already is a
+    pool worker (e.g. of the render server) which cannot start a pool of its own.
+    """
+    jobs = min(int(jobs), len(arguments))
+    if jobs <= 1 or multiprocessing.current_process().daemon:
+        return [process(*args) for args in arguments]
+    with multiprocessing.Pool(jobs) as pool:
+        return pool.starmap(process, arguments)
+
+def call(task):
+    (process, args) = task
+    return process(*args)
+
+def parallel_imap(process, arguments, jobs=1):
+    """
+    Like 'parallel_map', but yields the outputs one at a time in the same order as they are ready, so a caller that
+    merges the outputs holds only a few of them at once.
+    """
+    jobs = min(int(jobs), len(arguments))
+    if jobs <= 1 or multiprocessing.current_process().daemon:
+        for args in arguments:
+            yield process(*args)
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(call, [(process, args) for args in arguments])
 
 def metric_label(log_type):
     if (log_type == "bw"):
@@ -54,18 +87,18 @@ def elapsed_time_string(args):
     else:
         return "{} sec".format(args.every_nth/1000)
 
-def combine(results):
-    # prepare for data extraction by building a 3-dimensional array of [result set, x/y, data]
-    split_values = np.split(results,len(results))
-    length = max([len(val[0][0]) for val in split_values])
-    values = [np.array(arr[0]) for arr in split_values]
-    # extract x_values by finding unique x values across result sets
-    x_filter = np.concatenate([v[1] for v in values])
-    x_values = np.unique(x_filter)
-    # extract y_values by summing y values across result sets
-    y_filter = [np.array(v[0]) if len(v[0]) == length else np.concatenate([v[0],np.zeros(length-len(v[0]))]) for v in values]
-    y_values = np.sum(y_filter, axis=0)
-    return [(y_values,x_values)]
+def aggregated_label(files):
+    """
+    Returns the legend label of the single data set that '-agg' builds from the files.
+    """
+    return ", ".join([simply_filename(f) for f in files]) if len(files) < 3 else "aggregated files"
+
+def mode_output(output, mode):
+    """
+    Returns the output filepath for one mode of a run that builds graphs in several modes, e.g. 'output-ios.png'.
+    """
+    (root, ext) = os.path.splitext(output)
+    return "{}-{}{}".format(root, mode, ext)
 
 def simply_filename(filename):
     filenames = re.split(r"[\/\\]", filename)
@@ -0,0 +1,140 @@
+import os
+import io
+import time
+import shlex
+import argparse
+import contextlib
+import multiprocessing
+
+import fiologparser
+import fiohistogram
+from max_value_finder import find_max_and_iops
+from fio_compress import find_logs, strip_compression
+
+###################################################
+# BATCH MODE
+###################################################
+# the graphs built by scripts/graph-builder.sh for every log file. placeholders:
+# {file} log filepath, {name} log filename without '.log', {out} output folder,
+# {logtype} the log type, {max} max value and {iops} max IOPS across all logs
+DEFAULT_SPEC = [
+    'fiologparser -m io_count -lt {logtype} --title "IOPS distribution over the course of experiment" -o "{out}/{name}-iocount.png" -f "{file}" -aa {iops}',
+    'fiologparser -m ios -lt {logtype} --title "Measurement value per I/O" -o "{out}/{name}-ios-ylog.png" -f "{file}" -ylog -aa {max}',
+    'fiologparser -m mixed -lt {logtype} --title "Measurement value per I/O" -o "{out}/{name}-mixed-ylog.png" -f "{file}" -ylog -aa {max}',
+    'fiohistogram -lt {logtype} -f "{file}" -m simple -o "{out}/{name}-hist.png" --bins 100 --min 0 --max {max}',
+    'fiohistogram -lt {logtype} -f "{file}" -m simple -o "{out}/{name}-hist-ylog.png" --bins 100 --ylog --min 0 --max {max}',
+]
+TOOLS = {
+    "fiologparser": fiologparser,
+    "fiohistogram": fiohistogram,
+}
+
+def load_spec(filepath):
+    """
+    Reads a graph spec: one graph per line given as 'fiologparser' or 'fiohistogram' followed by its arguments.
+    Empty lines and lines starting with '#' are ignored.
+    """
+    with open(filepath) as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+def parse_graph(line, values, cache=True):
+    """
+    Fills in the placeholders of a spec line and returns (tool, args) with args parsed by the tool's own argument parser.
+    """
+    argv = shlex.split(line.format(**values))
+    if argv[0] not in TOOLS:
+        raise ValueError("unknown tool '{}' in graph spec, expected one of: {}".format(argv[0], ", ".join(TOOLS)))
+    tool = TOOLS[argv[0]]
+    if cache:
+        argv.append("--cache")
+    return (tool, tool.build_parser().parse_args(argv[1:]))
+
+def run_graphs(filepath, spec, values, cache=True, verbose=False):
+    """
+    Builds every graph of the spec for a single log file. Returns a list of (output, seconds, error) per graph.
+    """
+    name = strip_compression(os.path.basename(filepath))
+    values = dict(values, file=filepath, name=name[:-len(".log")] if name.endswith(".log") else name)
+    timings = []
+    for line in spec:
+        start_time = time.time_ns()
+        output = line
+        error = None
+        try:
+            (tool, args) = parse_graph(line, values, cache=cache)
+            output = args.output
+            if verbose:
+                tool.run(args)
+            else:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    tool.run(args)
+        except (SystemExit, Exception) as e:
+            error = repr(e)
+        timings.append((output, (time.time_ns() - start_time) / 1E9, error))
+    return timings
+
+def print_summary(files, results, wall_time):
+    print("{:<60} {:>10}  {}".format("Graph", "Time (sec)", "Status"))
+    slowest = (None, 0)
+    for (filepath, timings) in zip(files, results):
+        for (output, seconds, error) in timings:
+            print("{:<60} {:>10.3f}  {}".format(output, seconds, error if error else "ok"))
+        file_time = sum([t[1] for t in timings])
+        if file_time > slowest[1]:
+            slowest = (filepath, file_time)
+    failed = sum([1 for timings in results for t in timings if t[2]])
+    print("Built {} graph(s) from {} log file(s), {} failed.".format(sum([len(t) for t in results]) - failed, len(files), failed))
+    if slowest[0]:
+        print("Slowest log file: {} ({:.3f} sec)".format(slowest[0], slowest[1]))
+    print("Total wall time: {:.3f} sec".format(wall_time))
+
+def run(args):
+    start_time = time.time_ns()
+    pattern = args.pattern.format(logtype=args.logtype)
+    files = find_logs(args.folder, pattern)
+    if not files:
+        print("No log files matching '{}' found in '{}'. Exiting...".format(pattern, args.folder))
+        return
+    spec = load_spec(args.spec) if args.spec else DEFAULT_SPEC
+    output = args.output if args.output else args.folder
+    os.makedirs(output, exist_ok=True)
+    print("Found {} log file(s), building {} graph(s) per file with {} worker(s)".format(len(files), len(spec), args.jobs))
+
+    # global axis limits are computed once for all log files
+    maxes_start = time.time_ns()
+    (maxValue, maxTraces) = find_max_and_iops(files, verbose=args.verbose, cache=not args.no_cache, jobs=args.jobs)
+    print("MAX={}".format(maxValue))
+    print("MAX_IOPS={}".format(maxTraces))
+    print("Found max values in {:.3f} sec.".format((time.time_ns() - maxes_start) / 1E9))
+
+    values = {"out": output, "logtype": args.logtype, "max": maxValue, "iops": maxTraces}
+    tasks = [(f, spec, values, not args.no_cache, args.verbose) for f in files]
+    jobs = max(1, min(args.jobs, len(files)))
+    if jobs == 1:
+        results = [run_graphs(*task) for task in tasks]
+    else:
+        with multiprocessing.Pool(jobs) as pool:
+            results = pool.starmap(run_graphs, tasks)
+    print_summary(files, results, (time.time_ns() - start_time) / 1E9)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Builds the graphs of a graph spec for every log file in an experiment folder.")
+    parser.add_argument('folder', help="folder containing the fio log files")
+    parser.add_argument('-lt','--logtype', help="the type for values in files. defaults to 'lat'", default="lat", choices=["bw","lat","iops"])
+    parser.add_argument('-p','--pattern', help="filename pattern for log files, '{logtype}' is replaced by the log type. "
+                        "compressed logs matching the pattern are found as well. defaults to '*_{logtype}.*.log'",
+                        default="*_{logtype}.*.log")
+    parser.add_argument('-s','--spec', help="graph spec file with one 'fiologparser ...' or 'fiohistogram ...' argument line per graph. "
+                        "defaults to the graphs of graph-builder.sh")
+    parser.add_argument('-o','--output', help="folder for the built graphs. defaults to the log folder")
+    parser.add_argument('-j','--jobs', type=int, default=multiprocessing.cpu_count(), help="number of worker processes. defaults to the number of cores")
+    parser.add_argument('--no_cache', default=False, action='store_true', help="parse the text log for every graph instead of reusing cached columns")
+    parser.add_argument('-v','--verbose', help="print the output of every graph build", default=False, action='store_true')
+    return parser
+
+def main():
+    print("Welcome to FioLogParser - Batch!")
+    run(build_parser().parse_args())
+
+if __name__ == '__main__':
+    main()
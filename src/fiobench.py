@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import contextlib
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+import fiogen
+
+###################################################
+# BENCHMARKS
+###################################################
+# every mode is timed in its own freshly spawned process, split into the phases 'parse' (text to columns), 'aggregate'
+# (columns to the values of the graph) and 'render' (drawing and saving the graph), so the peak RSS of the process belongs
+# to that mode alone. the results are saved as JSON and can be compared with the results of another commit
+MODES = ["elapsed", "ios", "io_count", "mixed", "hist_simple", "hist_normal", "hist_kernel", "max_value"]
+PHASES = ["parse", "aggregate", "render"]
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of this process in MiB (ru_maxrss is in KiB on Linux and in bytes on macOS).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+def timed(phases, phase, process, *args):
+    start_time = time.perf_counter()
+    result = process(*args)
+    phases[phase] = phases.get(phase, 0) + time.perf_counter() - start_time
+    return result
+
+def tool_args(tool, argv):
+    return tool.build_parser().parse_args(argv)
+
+def bench_fiologparser(mode, filepath, output, logtype, phases):
+    import fiologparser
+    from fio_reader import load_columns
+    args = tool_args(fiologparser, ["-m", mode, "-lt", logtype, "-f", filepath, "-o", output])
+    if mode == "elapsed":
+        from fioelapsed import elapsed_values as aggregate, build_elapsed_graphs as render
+        aggregate_args = (args,)
+    elif mode == "ios":
+        from fioios import count_values as aggregate, build_count_graphs as render
+        aggregate_args = ()
+    elif mode == "io_count":
+        from fioio_count import count_ios as aggregate, build_io_count_graphs as render
+        aggregate_args = (args,)
+    else:
+        from fiomixed import split_read_write as aggregate, build_mixed_read_write_graphs as render
+        aggregate_args = ()
+    log = timed(phases, "parse", lambda: load_columns(filepath, verbose=False, progress=False, cache=False, summary=False))
+    result = timed(phases, "aggregate", aggregate, *aggregate_args, log)
+    timed(phases, "render", render, args, [result])
+
+def bench_fiohistogram(mode, filepath, output, logtype, phases):
+    import fiohistogram
+    from fio_reader import load_columns, VALUE
+    args = tool_args(fiohistogram, ["-m", mode, "-lt", logtype, "-f", filepath, "-o", output])
+
+    def prepare(log):
+        # the scaling and range of 'fiohistogram.run', plus the estimate of the mode
+        sample = log[VALUE] / 1000
+        (smin, smax) = (np.min(sample), np.max(sample))
+        if mode == "normal":
+            return (sample, smin, smax, (np.mean(sample), np.std(sample)))
+        if mode == "kernel":
+            return (sample, smin, smax, fiohistogram.calc_density(args, sample, smin, smax))
+        return (sample, smin, smax, None)
+
+    def render(sample, smin, smax, estimate):
+        # the simple histogram is binned by matplotlib while drawing, so its binning counts as rendering
+        if mode == "normal":
+            fiohistogram.normal_distribution(args, sample, smin, smax)
+        elif mode == "kernel":
+            fiohistogram.kernel_density(args, sample, smin, smax, density=estimate)
+        else:
+            fiohistogram.histogram(args, sample, smin, smax)
+        fiohistogram.plt.savefig(args.output)
+        fiohistogram.plt.close()
+
+    log = timed(phases, "parse", lambda: load_columns(filepath, verbose=False, progress=False, cache=False, summary=False))
+    prepared = timed(phases, "aggregate", prepare, log)
+    timed(phases, "render", render, *prepared)
+
+def bench_max_value(filepath, phases):
+    from max_value_finder import scan_log
+    # the scan folds every block into the maxima as soon as it is parsed, so the aggregation is part of 'parse'
+    timed(phases, "parse", lambda: scan_log(filepath, cache=False, summary=False))
+    phases["aggregate"] = 0.0
+    phases["render"] = 0.0
+
+def run_mode(mode, filepath, workdir, logtype, verbose=False):
+    """
+    Runs one benchmark of the mode and returns its phase times in seconds and the peak RSS. Meant to run in a fresh process.
+    """
+    phases = {}
+    output = os.path.join(workdir, "bench-{}.png".format(mode))
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        # the base RSS includes the libraries every mode loads, so the peak above it is the memory of the mode
+        import matplotlib.pyplot
+        base_rss = peak_rss_mb()
+        if mode in ["elapsed", "ios", "io_count", "mixed"]:
+            bench_fiologparser(mode, filepath, output, logtype, phases)
+        elif mode.startswith("hist_"):
+            bench_fiohistogram(mode[len("hist_"):], filepath, output, logtype, phases)
+        else:
+            bench_max_value(filepath, phases)
+    phases["total"] = sum(phases[p] for p in PHASES)
+    phases["base_rss_mb"] = base_rss
+    phases["peak_rss_mb"] = peak_rss_mb()
+    return phases
+
+def run_isolated(mode, filepath, workdir, logtype, verbose=False):
+    """
+    Runs 'run_mode' in a newly spawned process, which does not share memory with this one.
+    """
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_mode, (mode, filepath, workdir, logtype, verbose))
+
+def best_of(runs):
+    """
+    Combines repeated runs of a mode: the fastest time of every phase and the highest peak RSS.
+    """
+    best = {key: min(run[key] for run in runs) for key in PHASES + ["total"]}
+    best["base_rss_mb"] = max(run["base_rss_mb"] for run in runs)
+    best["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+    return best
+
+def git_commit():
+    """
+    Returns (commit, dirty) of the working tree of this script or (None, None) outside of a git repository.
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=folder, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=folder, capture_output=True, text=True, check=True).stdout
+        return (commit, bool(status.strip()))
+    except (OSError, subprocess.CalledProcessError):
+        return (None, None)
+
+def generator_settings(args):
+    return {"rows": args.rows, "seed": args.seed, "iops": args.iops, "read_ratio": args.read_ratio, "block_sizes": args.block_sizes,
+            "latency": args.latency, "mean": args.mean, "offset": args.offset}
+
+def compare(results, baseline):
+    """
+    Prints the total time and peak RSS of every mode relative to the results of a previous run.
+    """
+    print("{:<12} {:>10} {:>10} {:>8} {:>10} {:>10} {:>8}".format("mode", "base sec", "sec", "ratio", "base MiB", "MiB", "ratio"))
+    for (mode, result) in results["results"].items():
+        old = baseline["results"].get(mode)
+        if old is None:
+            print("{:<12} {:>10} {:>10.3f} {:>8} {:>10} {:>10.1f} {:>8}".format(mode, "-", result["total"], "-", "-", result["peak_rss_mb"], "-"))
+            continue
+        print("{:<12} {:>10.3f} {:>10.3f} {:>8.2f} {:>10.1f} {:>10.1f} {:>8.2f}".format(mode, old["total"], result["total"], result["total"] / max(old["total"], 1E-9),
+              old["peak_rss_mb"], result["peak_rss_mb"], result["peak_rss_mb"] / max(old["peak_rss_mb"], 1E-9)))
+    if baseline["log"]["rows"] != results["log"]["rows"]:
+        print("warning: the baseline was measured on a log of {} entries, this run on {}".format(baseline["log"]["rows"], results["log"]["rows"]))
+
+def run(args):
+    start_time = time.time_ns()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="fiobench-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        if args.log:
+            filepath = args.log
+            settings = None
+        else:
+            filepath = os.path.join(workdir, "synthetic_{}.1.log".format(args.logtype))
+            settings = generator_settings(args)
+            generate_start = time.time_ns()
+            fiogen.generate(argparse.Namespace(output=filepath, **settings))
+            print("Generated {} entries in {:.3f} sec".format(args.rows, (time.time_ns() - generate_start) / 1E9))
+        (commit, dirty) = git_commit()
+        results = {"commit": commit, "dirty": dirty, "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                   "numpy": np.__version__, "platform": platform.platform(), "repeat": args.repeat,
+                   "log": {"path": filepath, "rows": args.rows if settings else None, "bytes": os.path.getsize(filepath), "logtype": args.logtype, "generator": settings},
+                   "results": {}}
+        for mode in args.modes:
+            runs = [run_isolated(mode, filepath, workdir, args.logtype, args.verbose) for i in range(args.repeat)]
+            result = best_of(runs)
+            results["results"][mode] = result
+            print("{:<12} parse {:>8.3f}  aggregate {:>8.3f}  render {:>8.3f}  total {:>8.3f} sec  peak RSS {:>8.1f} MiB".format(
+                mode, result["parse"], result["aggregate"], result["render"], result["total"], result["peak_rss_mb"]))
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Saved results to '{}'".format(args.output))
+        if args.compare:
+            with open(args.compare) as f:
+                compare(results, json.load(f))
+    finally:
+        if not args.workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print("Completed benchmarks ({:.3f} sec).".format((time.time_ns() - start_time) / 1E9))
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Times the modes of FioLogParser on a synthetic (or given) log, phase by phase, and saves the results as JSON.")
+    parser.add_argument('-m','--modes', nargs='+', choices=MODES, default=MODES, help="the modes to benchmark. defaults to all")
+    parser.add_argument('-o','--output', help="filepath for the JSON results. defaults to 'bench.json'", default="bench.json")
+    parser.add_argument('--compare', help="JSON results of a previous run (e.g. of another commit) to compare against")
+    parser.add_argument('-r','--repeat', type=int, default=1, help="runs per mode, the fastest time of each phase is kept. defaults to 1")
+    parser.add_argument('-lt','--logtype', help="the type for values in the log. defaults to 'lat'", default="lat", choices=["bw","lat","iops"])
+    parser.add_argument('--log', help="benchmark this log instead of generating one")
+    parser.add_argument('--workdir', help="folder for the generated log and graphs, which is kept. defaults to a temporary folder")
+    parser.add_argument('--keep', default=False, action='store_true', help="keep the temporary folder")
+    parser.add_argument('-v','--verbose', help="print the output of the modes", default=False, action='store_true')
+    return fiogen.add_generator_arguments(parser)
+
+def main():
+    run(build_parser().parse_args())
+
+if __name__ == '__main__':
+    main()
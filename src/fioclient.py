@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import socket
+import argparse
+import tempfile
+import importlib
+
+###################################################
+# RENDER CLIENT
+###################################################
+# a thin client for the render server (see fioserver.py): it only imports the standard library and sends the arguments of
+# a single run as one JSON line, e.g. {"argv": ["fiologparser", "-m", "ios", ...], "cwd": "/path"}, and receives one JSON line
+# {"status": 0, "output": "...", "seconds": 0.1} back
+TOOLS = ["fiologparser", "fiohistogram", "fiohistlog", "fioreport", "max_value_finder"]
+
+def socket_path():
+    """
+    Returns the Unix socket of the render server: $FIO_SERVER_SOCKET or a socket per user in the temp folder.
+    """
+    return os.environ.get("FIO_SERVER_SOCKET") or os.path.join(tempfile.gettempdir(), "fiologparser-{}.sock".format(os.getuid()))
+
+def send(request, path):
+    """
+    Sends a request to the render server and returns its response. Raises OSError if no server is listening.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall((json.dumps(request) + "\n").encode())
+        with s.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("render server closed the connection")
+    return json.loads(line)
+
+def run_locally(argv):
+    """
+    Runs the tool in this process the same way as 'python3 <tool>.py <args>'.
+    """
+    tool = importlib.import_module(argv[0])
+    sys.argv = [argv[0] + ".py"] + argv[1:]
+    try:
+        tool.main()
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Runs a FioLogParser tool on the render server (see fioserver.py), or locally if no server is running. "
+                                     "example: fioclient.py fiologparser -m ios -lt lat -f job_lat.1.log")
+    parser.add_argument('--socket', help="the Unix socket of the render server. defaults to $FIO_SERVER_SOCKET or a socket per user in the temp folder", default=socket_path())
+    parser.add_argument('--no_fallback', default=False, action='store_true', help="fail instead of running the tool locally if no server is running")
+    parser.add_argument('--stop', default=False, action='store_true', help="stop the render server")
+    parser.add_argument('tool', nargs='?', choices=TOOLS, help="the tool to run")
+    parser.add_argument('arguments', nargs=argparse.REMAINDER, help="the arguments of the tool")
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+    if args.stop:
+        try:
+            sys.stdout.write(send({"command": "stop"}, args.socket)["output"])
+        except OSError as e:
+            print("No render server at '{}' ({})".format(args.socket, e), file=sys.stderr)
+            sys.exit(1)
+        return
+    if not args.tool:
+        build_parser().error("a tool is required")
+    argv = [args.tool] + args.arguments
+    try:
+        response = send({"argv": argv, "cwd": os.getcwd()}, args.socket)
+    except OSError as e:
+        if args.no_fallback:
+            print("No render server at '{}' ({})".format(args.socket, e), file=sys.stderr)
+            sys.exit(1)
+        sys.exit(run_locally(argv))
+    sys.stdout.write(response["output"])
+    sys.exit(response["status"])
+
+if __name__ == '__main__':
+    main()
@@ -1,115 +1,240 @@
 import sys
-import re
-import time
-import math
+import itertools
 
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 
-from line_count import line_count
-from fio_utils import metric_label, combine, simply_filename, every_nth, not_same_every_nth, file_check, time_it, elapsed_time_string
+from fio_reader import iter_columns, TIME, VALUE
+from fio_seek import time_range
+from fio_instrument import phase, timed
+from fio_utils import metric_label, simply_filename, aggregated_label, every_nth, not_same_every_nth, file_check, time_it, elapsed_time_string, parallel_map
+from fio_aggregate import aggregate_files
+from fio_hdr import WindowHistograms
+
+# the percentiles drawn by '--percentiles' without values
+DEFAULT_PERCENTILES = [50, 99, 99.9]
 
 ###################################################
 # ELAPSED MODE
 ###################################################
-def build_elapsed_graphs(args):
+def build_elapsed_graphs(args, results=None):
+    """
+    Builds the graph from the results of 'load_input_for_elapsed' per file which are loaded if not given.
+    With '-agg' the files are loaded into a single set of windows instead and results holds its single result.
+    """
     ylabel = metric_label(args.logtype)
     fig, ax = plt.subplots()
 
-    for i in range(len(args.files)):
-        filepath = args.files[i]
-        file_check(filepath)
-        (y_values, x_values, y_lows, y_highs) = time_it(load_input_for_elapsed, args.verbose, args, filepath, start_tag="",end_tag="Input load time")
-
-        if args.graphtype == "dots":
-            ax.scatter(x_values,y_values, s=10)
-        elif args.graphtype == "line":
-            ax.plot(x_values,y_values)
-        elif args.graphtype == "bar":
-            print("bar graph not supported for this mode")
-            sys.exit()
+    if results is None:
+        for filepath in args.files:
+            file_check(filepath)
+        if args.aggregate_files:
+            results = [time_it(aggregate_files, args.verbose, args, load_windows_for_elapsed, start_tag="", end_tag="Input load time", phase="load").result()]
         else:
-            ax.errorbar(x_values,y_values,yerr=[y_lows, y_highs], fmt='o', linewidth=1, markersize=5)
-        if args.logscale_y:
-            ax.set_yscale('log')
-        else:
-            if(args.axisalign):
-                ax.set_ylim(bottom=0, top=args.axisalign)
+            results = time_it(parallel_map, args.verbose, load_input_for_elapsed, [(args, f) for f in args.files], args.jobs, start_tag="",end_tag="Input load time", phase="load")
+    names = [aggregated_label(args.files)] if args.aggregate_files else [simply_filename(f) for f in args.files]
+    with phase("render"):
+        for name, (y_values, x_values, y_lows, y_highs, bands) in zip(names, results):
+
+            if args.graphtype == "bar":
+                print("bar graph not supported for this mode")
+                sys.exit()
+            elif bands is not None:
+                draw_percentiles(args, ax, name, x_values, y_values, bands)
+            elif args.graphtype == "dots":
+                ax.scatter(x_values,y_values, s=10)
+            elif args.graphtype == "line":
+                ax.plot(x_values,y_values)
             else:
-                ax.set_ylim(bottom=0)
+                ax.errorbar(x_values,y_values,yerr=[y_lows, y_highs], fmt='o', linewidth=1, markersize=5)
+            if args.logscale_y:
+                ax.set_yscale('log')
+            else:
+                if(args.axisalign):
+                    ax.set_ylim(bottom=0, top=args.axisalign)
+                else:
+                    ax.set_ylim(bottom=0)
 
-    ax.legend([simply_filename(f) for f in args.files], loc="upper right")
-    ax.set(xlabel="Elapsed time (sec)", ylabel=ylabel,title=args.title)
-    ax.grid()
+        if percentile_levels(args):
+            # every drawn series carries its own label
+            ax.legend(loc="upper right")
+        else:
+            ax.legend(names, loc="upper right")
+        ax.set(xlabel="Elapsed time (sec)", ylabel=ylabel,title=args.title)
+        ax.grid()
     # plt.tight_layout()
-    fig.savefig(args.output)
+    timed("savefig", fig.savefig, args.output)
     plt.close()
 
+def draw_percentiles(args, ax, name, x_values, y_values, bands):
+    """
+    Draws the mean values of a file together with its percentile bands (see '--percentiles'): for 'line' a line per
+    percentile with the area between the lowest and highest percentile shaded, for 'dots' a dot per percentile, and for
+    'errorbar' error bars from the lowest to the highest percentile with the percentiles in between marked.
+    """
+    levels = percentile_levels(args)
+    labels = ["{} p{:g}".format(name, p) for p in levels]
+    if args.graphtype == "dots":
+        color = ax.scatter(x_values, y_values, s=10, label="{} mean".format(name)).get_facecolor()[0]
+        for (band, label, marker) in zip(bands, labels, itertools.cycle(["v", "^", "x", "+"])):
+            ax.scatter(x_values, band, s=6, marker=marker, color=color, label=label)
+    elif args.graphtype == "line":
+        color = ax.plot(x_values, y_values, label="{} mean".format(name))[0].get_color()
+        ax.fill_between(x_values, bands[0], bands[-1], color=color, alpha=0.2, linewidth=0)
+        for (band, label, style) in zip(bands, labels, itertools.cycle(["--", ":", "-."])):
+            ax.plot(x_values, band, color=color, linestyle=style, linewidth=0.8, label=label)
+    else:
+        yerr = [np.maximum(y_values - bands[0], 0), np.maximum(bands[-1] - y_values, 0)]
+        color = ax.errorbar(x_values, y_values, yerr=yerr, fmt='o', linewidth=1, markersize=5,
+                            label="{} mean, p{:g}-p{:g}".format(name, levels[0], levels[-1]))[0].get_color()
+        for (band, label) in zip(bands[1:-1], labels[1:-1]):
+            ax.scatter(x_values, band, s=30, marker="_", color=color, label=label)
+
+def percentile_levels(args):
+    """
+    Returns the sorted percentiles given by '--percentiles' (DEFAULT_PERCENTILES if given without values), or None.
+    """
+    levels = getattr(args, "percentiles", None)
+    if levels is None:
+        return None
+    return sorted(levels) if levels else DEFAULT_PERCENTILES
+
+class ElapsedWindows:
+    """
+    Streaming aggregation of log entries into elapsed time windows of every_nth msec, where window b
+    holds the entries with a timestamp in (b*every_nth, (b+1)*every_nth]. Blocks of entries can be added
+    in any order, so memory grows with the number of windows and not with the number of entries. The arrays
+    start at the first window seen (base), so a log that starts late (e.g. with '--from_ms') only holds the
+    windows between its first and last entry.
+    With percentiles (e.g. [50, 99, 99.9]) the values of every window are also counted in a 'WindowHistograms'.
+    """
+    def __init__(self, every_nth, percentiles=None):
+        self.every_nth = int(every_nth)
+        self.percentiles = percentiles
+        self.histograms = WindowHistograms() if percentiles else None
+        self.sums = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.lows = np.zeros(0, dtype=np.int64)
+        self.highs = np.zeros(0, dtype=np.int64)
+        self.lasts = np.zeros(0, dtype=np.int64)
+        self.base = None
+
+    def reserve(self, first, end):
+        """
+        Grows the arrays to hold the windows first to end (exclusive), moving the base back if first lies before it.
+        """
+        if self.base is None:
+            self.base = first
+        start = min(self.base, first)
+        if start == self.base and end <= self.base + len(self.counts):
+            return
+        size = max(max(end, self.base + len(self.counts)) - start, 2 * len(self.counts))
+        grown = [np.zeros(size, dtype=np.int64) for i in range(5)]
+        grown[2][:] = np.iinfo(np.int64).max
+        shift = self.base - start
+        for (new, old) in zip(grown, [self.sums, self.counts, self.lows, self.highs, self.lasts]):
+            new[shift:shift + len(old)] = old
+        (self.sums, self.counts, self.lows, self.highs, self.lasts) = grown
+        self.base = start
+
+    def add(self, times, values):
+        """
+        Adds a block of entries given by their timestamps and measurement values.
+        """
+        if len(times) == 0:
+            return self
+        times = np.asarray(times, dtype=np.int64)
+        values = np.asarray(values, dtype=np.int64)
+        windows = np.maximum(times - 1, 0) // self.every_nth
+        if self.histograms is not None:
+            self.histograms.add(windows, values)
+        if np.any(windows[1:] < windows[:-1]):
+            order = np.argsort(windows, kind="stable")
+            (windows, times, values) = (windows[order], times[order], values[order])
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(windows)) + 1])
+        self.reserve(windows[0], windows[-1] + 1)
+        ids = windows[starts] - self.base
+        self.sums[ids] += np.add.reduceat(values, starts)
+        self.counts[ids] += np.diff(np.append(starts, len(windows)))
+        self.lows[ids] = np.minimum(self.lows[ids], np.minimum.reduceat(values, starts))
+        self.highs[ids] = np.maximum(self.highs[ids], np.maximum.reduceat(values, starts))
+        self.lasts[ids] = np.maximum(self.lasts[ids], np.maximum.reduceat(times, starts))
+        return self
+
+    def merge(self, other):
+        """
+        Adds the windows of other, which must have the same every_nth, e.g. those of another file aligned on the same elapsed time.
+        """
+        if other.base is None:
+            return self
+        n = len(other.counts)
+        self.reserve(other.base, other.base + n)
+        part = slice(other.base - self.base, other.base - self.base + n)
+        self.sums[part] += other.sums
+        self.counts[part] += other.counts
+        self.lows[part] = np.minimum(self.lows[part], other.lows)
+        self.highs[part] = np.maximum(self.highs[part], other.highs)
+        self.lasts[part] = np.maximum(self.lasts[part], other.lasts)
+        if self.histograms is not None:
+            self.histograms.merge(other.histograms)
+        return self
+
+    def result(self):
+        """
+        Returns (y_values, x_values, y_lows, y_highs, bands) for every window that holds at least one entry, see 'load_input_for_elapsed'.
+        """
+        used = self.counts > 0
+        y_values = self.sums[used] / self.counts[used] / 1000
+        bands = None
+        if self.histograms is not None:
+            # the windows of the histograms are the used windows, the interpolated percentiles stay within the values of a window
+            (windows, values) = self.histograms.quantiles([p / 100 for p in self.percentiles])
+            bands = np.clip(values, self.lows[windows - self.base], self.highs[windows - self.base]) / 1000
+        return (y_values, self.lasts[used] / 1000, self.lows[used] / 1000, self.highs[used] / 1000, bands)
+
 def load_input_for_elapsed(args, filepath):
     """
     Loads and parses the input from the given filepath. 
-    Returns a 4-tuple of (y_values, x_values, y_lows, y_highs) 
+    Returns a 5-tuple of (y_values, x_values, y_lows, y_highs, bands) 
     where y_values are the average values of the experiment, 
     x_values are the elapsed time in msec for the average values, 
-    y_lows are the lowest y values per elapsed time, and y_highs 
-    are the highest y values per elapsed time.
+    y_lows are the lowest y values per elapsed time, y_highs 
+    are the highest y values per elapsed time, and bands are the
+    '--percentiles' per elapsed time as a [percentiles, windows] array
+    (None without '--percentiles').
+    The log is aggregated block by block, see 'ElapsedWindows'.
+    """
+    return load_windows_for_elapsed(args, filepath).result()
+
+def load_windows_for_elapsed(args, filepath):
+    """
+    Returns the 'ElapsedWindows' of the log at the given filepath.
     """
-    lc = time_it(line_count, args.verbose, filepath, start_tag="Reading lines in file...", end_tag="Line Count Time") + 1
-    print("Lines in file: {}".format(lc))
-    start_time = time.time_ns()
-    y_values = np.zeros([lc,1])
-    x_values = np.zeros([lc,1])
-    y_lows = np.zeros([lc])
-    y_highs = np.zeros([lc])
-    k = 0
     if args.verbose:
         print("Starting reading input...")
-    with open(filepath) as f:
-        line_fraction = int(math.ceil(lc / 1E2))
-        counter = 0
-        NthCounter = int(args.every_nth)
-        time_now = 0
-        log = []
-        y_sum = 0
-        y_low = 0 
-        y_high = 0
-        x_last = 0
-        j = 1
-        for i, line in enumerate(f):
-            log = re.split(", ", line)
-            timeVal = int(log[0])
-            metricVal = int(log[1])
-            if (i == 0):
-                y_sum = metricVal
-                y_high = metricVal
-                y_low = metricVal
-                j += 1
-            elif ((i == (lc-1)) or # index is last line in file
-                 (timeVal > NthCounter)):
-                y_avg = y_sum / j
-                y_values[k] = y_avg / 1000
-                x_values[k] = x_last / 1000
-                y_lows[k] = y_low / 1000
-                y_highs[k] = y_high / 1000
-                y_sum = metricVal
-                y_high = metricVal
-                y_low = metricVal
-                j = 1
-                k += 1
-                NthCounter += int(args.every_nth)
-            else:
-                y_sum += metricVal
-                if (metricVal < y_low):
-                    y_low = metricVal
-                if (metricVal > y_high):
-                    y_high = metricVal
-                j += 1
-            x_last = timeVal
-            if(counter % line_fraction == 0):
-                time_now = time.time_ns()
-                print("Progress: {:.0f}% ({:.3f} msec)".format(((counter / lc) * 100), (time_now - start_time) / 1E6),end="\r")
-                start_time = time_now
-            counter += 1
-    print()
-    return (y_values[:k,:], x_values[:k,:], y_lows[:k], y_highs[:k])
\ No newline at end of file
+    windows = new_elapsed_windows(args)
+    lc = 0
+    for log in iter_columns(filepath, verbose=args.verbose, cache=args.cache, jobs=args.jobs, time_range=time_range(args)):
+        timed("aggregate", windows.add, log[TIME], log[VALUE])
+        lc += log.shape[1]
+    print("Lines in file: {}".format(lc))
+    return windows
+
+def new_elapsed_windows(args):
+    """
+    Returns empty 'ElapsedWindows' of '--every_nth' that also count the '--percentiles' if given.
+    """
+    return ElapsedWindows(args.every_nth, percentile_levels(args))
+
+def elapsed_windows(args, log):
+    """
+    Returns the 'ElapsedWindows' of an already parsed log.
+    """
+    return new_elapsed_windows(args).add(log[TIME], log[VALUE])
+
+def elapsed_values(args, log):
+    """
+    Returns the result of 'load_input_for_elapsed' for an already parsed log.
+    """
+    return elapsed_windows(args, log).result()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import time
+
+from fio_reader import LogFollower, TIME, VALUE, DIRECTION
+from fioelapsed import build_elapsed_graphs, new_elapsed_windows
+from fioio_count import build_io_count_graphs, new_io_windows
+from fio_aggregate import merge_all
+
+###################################################
+# FOLLOW MODE
+###################################################
+def new_state(args):
+    """
+    Returns the empty aggregation state of the mode, which is updated with every block of appended entries.
+    With '-agg' the states of all files are merged on every refresh.
+    """
+    if args.mode[0] == "elapsed":
+        return new_elapsed_windows(args)
+    return new_io_windows(args)
+
+def update(args, state, log):
+    if args.mode[0] == "elapsed":
+        state.add(log[TIME], log[VALUE])
+    else:
+        state.add(log[TIME], log[DIRECTION])
+
+def render(args, states):
+    if args.aggregate_files:
+        # merge into a new state, the states of the files keep counting their own entries
+        total = merge_all([new_state(args)] + states)
+        results = [total.result()]
+    else:
+        results = [state.result() for state in states]
+    if args.mode[0] == "elapsed":
+        build_elapsed_graphs(args, results)
+    else:
+        build_io_count_graphs(args, results)
+
+def follow_graphs(args):
+    """
+    Re-builds the graph every '--refresh' seconds while fio is still writing the logs. Only the bytes appended to each log
+    since the previous refresh are parsed and added to the aggregation state of its file, so a refresh costs time proportional
+    to the new entries. Runs until interrupted (Ctrl+C) or until no log has grown for '--idle_exit' seconds.
+    """
+    followers = [LogFollower(f) for f in args.files]
+    states = [new_state(args) for f in args.files]
+    counts = [0 for f in args.files]
+    last_growth = time.time()
+    print("Following {} log file(s), refreshing '{}' every {} sec. Press Ctrl+C to stop.".format(len(followers), args.output, args.refresh))
+    try:
+        while True:
+            start_time = time.time_ns()
+            new_entries = 0
+            for (i, follower) in enumerate(followers):
+                for log in follower.poll():
+                    if follower.restarted:
+                        print("Log '{}' was truncated, following it from the start".format(follower.filepath))
+                        (states[i], counts[i], follower.restarted) = (new_state(args), 0, False)
+                    update(args, states[i], log)
+                    new_entries += log.shape[1]
+                    counts[i] += log.shape[1]
+            if new_entries > 0:
+                last_growth = time.time()
+                render(args, states)
+                print("Refreshed '{}' with {} new entries ({} in total) in {:.3f} sec".format(args.output, new_entries, sum(counts), (time.time_ns() - start_time) / 1E9))
+            elif args.idle_exit and time.time() - last_growth >= args.idle_exit:
+                print("No new entries for {} sec. Stopped following.".format(args.idle_exit))
+                break
+            time.sleep(args.refresh)
+    except KeyboardInterrupt:
+        print("Stopped following.")
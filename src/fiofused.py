@@ -0,0 +1,120 @@
+import os
+import copy
+import math
+import argparse
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+from fio_reader import load_columns, TIME, VALUE
+from fio_seek import time_range
+from fio_records import scaled
+from fio_instrument import phase, timed
+from fio_utils import simply_filename, file_check, time_it, parallel_map, mode_output
+from fio_aggregate import merge_all
+from fioelapsed import build_elapsed_graphs, elapsed_values, elapsed_windows
+from fioios import build_count_graphs, count_values, value_buckets, aggregated_values
+from fioio_count import build_io_count_graphs, count_ios, io_windows
+from fiomixed import build_mixed_read_write_graphs, split_read_write
+from fiohistogram import histogram
+from max_value_finder import max_value, max_iops
+
+###################################################
+# FUSED MODE
+###################################################
+# modes whose files are merged into a single data set with '-agg'
+AGGREGATED_MODES = ["elapsed", "ios", "io_count"]
+
+def load_input_for_modes(args, filepath):
+    """
+    Parses the file once and feeds every requested mode from the parsed columns.
+    Returns a 3-tuple of (results, max_value, max_iops) where results maps each mode to its loaded input,
+    and max_value and max_iops are the values that max_value_finder.py would report for the file.
+    With '-agg' the modes in AGGREGATED_MODES load the time buckets (or windows) of the file, which are merged across files.
+    """
+    if args.verbose:
+        print("Starting reading input...")
+    log = load_columns(filepath, verbose=args.verbose, cache=args.cache, jobs=args.jobs, time_range=time_range(args))
+    print("Lines in file: {}".format(len(log[VALUE])))
+    results = {}
+    with phase("aggregate"):
+        for mode in args.mode:
+            if args.aggregate_files and mode in AGGREGATED_MODES:
+                results[mode] = aggregate_parts(args, mode, log)
+            elif mode == "elapsed":
+                results[mode] = elapsed_values(args, log)
+            elif mode == "ios":
+                results[mode] = count_values(log)
+            elif mode == "io_count":
+                results[mode] = count_ios(args, log)
+            elif mode == "mixed":
+                results[mode] = split_read_write(log)
+            elif mode == "hist":
+                # divide by 1000 to go from nsec -> usec, KiB/sec -> MiB/sec or IOPS -> kIOPS
+                results[mode] = scaled(log[VALUE])
+        return (results, max_value(log[VALUE]), max_iops(log[TIME], args.window_ms, args.slide_ms))
+
+def aggregate_parts(args, mode, log):
+    if mode == "elapsed":
+        return elapsed_windows(args, log)
+    if mode == "ios":
+        return value_buckets(args, log)
+    return io_windows(args, log)
+
+def aggregated_result(args, mode, parts):
+    """
+    Merges the parts of every file loaded by 'aggregate_parts' and returns the single result of the mode.
+    """
+    total = merge_all(parts)
+    if mode == "ios":
+        return aggregated_values(args, total)
+    return total.result()
+
+def histogram_args(args, smax):
+    """
+    Returns the fiohistogram.py arguments for a simple histogram from 0 to smax built with the options of this run.
+    """
+    return argparse.Namespace(mode="simple", logtype=args.logtype, bins=args.bins, hist_mode="pdf", min="0", max=str(smax),
+                              xlog=False, ylog=args.logscale_y, color=False, percentage=False)
+
+def build_histograms(args, files, samples, smax):
+    hist_args = histogram_args(args, smax)
+    for (filepath, sample) in zip(files, samples):
+        output = args.output if len(files) == 1 else mode_output(args.output, os.path.splitext(simply_filename(filepath))[0])
+        timed("render", histogram, hist_args, sample, 0, smax)
+        timed("savefig", plt.savefig, output)
+        plt.close()
+
+def build_fused_graphs(args):
+    """
+    Builds the graphs of several modes from a single parse of every file. With several modes each mode writes to the
+    output filepath with the mode appended (see 'mode_output') and, unless --axisalign is given, aligns its axis to the max value
+    (or max IOPS for 'io_count') found across all files in the same pass. The single data set of a mode aggregated with
+    '-agg' is not aligned.
+    """
+    for filepath in args.files:
+        file_check(filepath)
+    loaded = time_it(parallel_map, args.verbose, load_input_for_modes, [(args, f) for f in args.files], args.jobs, start_tag="", end_tag="Input load time", phase="load")
+    maxValue = int(math.ceil(max([l[1] for l in loaded], default=0)))
+    maxTraces = int(math.ceil(max([l[2] for l in loaded], default=0)))
+    print("MAX={}".format(maxValue))
+    print("MAX_IOPS={}".format(maxTraces))
+    for mode in args.mode:
+        mode_args = copy.copy(args)
+        mode_args.output = args.output if len(args.mode) == 1 else mode_output(args.output, mode)
+        results = [l[0][mode] for l in loaded]
+        if args.aggregate_files and mode in AGGREGATED_MODES:
+            results = [timed("aggregate", aggregated_result, args, mode, results)]
+        elif not args.axisalign:
+            mode_args.axisalign = maxTraces if mode == "io_count" else maxValue
+        print("Building graph '{}' in mode '{}'".format(mode_args.output, mode))
+        if mode == "elapsed":
+            build_elapsed_graphs(mode_args, results)
+        elif mode == "ios":
+            build_count_graphs(mode_args, results)
+        elif mode == "io_count":
+            build_io_count_graphs(mode_args, results)
+        elif mode == "mixed":
+            build_mixed_read_write_graphs(mode_args, results)
+        elif mode == "hist":
+            build_histograms(mode_args, args.files, results, mode_args.axisalign)
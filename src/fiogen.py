@@ -0,0 +1,99 @@
+import argparse
+
+import numpy as np
+
+###################################################
+# SYNTHETIC LOGS
+###################################################
+# writes fio style logs 'time, value, direction, bs[, offset]' from a seeded generator, so the same arguments always give
+# the same file. the offset distributions follow fio's 'random_distribution' (see experiments/randomness) with theta 0.8
+LATENCIES = ["lognormal", "normal", "pareto", "zipf"]
+OFFSETS = ["uniform", "normal", "pareto", "zipf"]
+CHUNK_ROWS = 1 << 17
+DISK_SIZE = 512 << 30
+
+def latency_values(rng, n, distribution, mean):
+    """
+    Returns n latencies in nsec drawn from the distribution, scaled so that the bulk of the values lie around mean.
+    """
+    if distribution == "normal":
+        values = rng.normal(mean, mean / 4, n)
+    elif distribution == "pareto":
+        values = (rng.pareto(2.5, n) + 1) * mean * 0.6
+    elif distribution == "zipf":
+        values = rng.zipf(2.0, n) * mean * 0.6
+    else:
+        values = rng.lognormal(np.log(mean), 0.5, n)
+    return np.maximum(values, 1).astype(np.int64)
+
+def offset_values(rng, n, distribution, block_sizes, theta=0.8):
+    """
+    Returns n block aligned offsets on a disk of DISK_SIZE bytes drawn from the distribution.
+    """
+    blocks = DISK_SIZE // max(block_sizes)
+    if distribution == "normal":
+        # deviation of theta percent of the disk around its middle
+        index = rng.normal(blocks / 2, blocks * theta / 100, n)
+    elif distribution == "pareto":
+        index = (rng.pareto(1 / theta, n)) * blocks / 100
+    elif distribution == "zipf":
+        index = rng.zipf(1 + theta, n)
+    else:
+        index = rng.integers(0, blocks, n)
+    return (np.asarray(index, dtype=np.int64) % blocks) * max(block_sizes)
+
+def generate_chunk(rng, start_time, n, args):
+    """
+    Returns the next n rows as a [n, columns] array and the elapsed time (msec, as float) after the last row.
+    """
+    arrivals = start_time + np.cumsum(rng.exponential(1000 / args.iops, n))
+    times = np.floor(arrivals).astype(np.int64) + 1
+    values = latency_values(rng, n, args.latency, args.mean)
+    directions = (rng.random(n) >= args.read_ratio).astype(np.int64)
+    block_sizes = rng.choice(np.array(args.block_sizes, dtype=np.int64), n)
+    columns = [times, values, directions, block_sizes]
+    if args.offset:
+        columns.append(offset_values(rng, n, args.offset, args.block_sizes))
+    return (np.stack(columns, axis=1), arrivals[-1])
+
+def generate(args):
+    """
+    Writes args.rows synthetic log entries to args.output, see 'build_parser' for the arguments.
+    """
+    rng = np.random.default_rng(args.seed)
+    elapsed = 0.0
+    columns = 5 if args.offset else 4
+    line = ", ".join(["%d"] * columns) + "\n"
+    with open(args.output, "w") as f:
+        for start in range(0, args.rows, CHUNK_ROWS):
+            n = min(CHUNK_ROWS, args.rows - start)
+            (rows, elapsed) = generate_chunk(rng, elapsed, n, args)
+            f.write((line * n) % tuple(rows.ravel().tolist()))
+    return args.output
+
+def add_generator_arguments(parser):
+    """
+    Adds the arguments of the generator, shared with fiobench.py.
+    """
+    parser.add_argument('-n','--rows', type=int, default=1000000, help="number of log entries. defaults to 1000000")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generator. defaults to 0")
+    parser.add_argument('--iops', type=float, default=10000, help="average IOs per second, sets the spacing of the timestamps. defaults to 10000")
+    parser.add_argument('--read_ratio', type=float, default=0.7, help="fraction of reads, the rest are writes. defaults to 0.7")
+    parser.add_argument('--block_sizes', type=int, nargs='+', default=[4096], help="block sizes picked uniformly per entry. defaults to 4096")
+    parser.add_argument('--latency', choices=LATENCIES, default="lognormal", help="distribution of the values. defaults to 'lognormal'")
+    parser.add_argument('--mean', type=float, default=20000, help="typical value in nsec. defaults to 20000")
+    parser.add_argument('--offset', choices=OFFSETS, help="add an offset column with offsets from this distribution")
+    return parser
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Writes a synthetic fio log from a seeded generator.")
+    parser.add_argument('-o','--output', help="filepath for the log. defaults to 'synthetic_lat.1.log'", default="synthetic_lat.1.log")
+    return add_generator_arguments(parser)
+
+def main():
+    args = build_parser().parse_args()
+    generate(args)
+    print("Wrote {} entries to '{}'".format(args.rows, args.output))
+
+if __name__ == '__main__':
+    main()
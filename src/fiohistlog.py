@@ -0,0 +1,183 @@
+import time
+import argparse
+
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+
+from fio_reader import load_columns
+from fio_records import DIRECTION_NAMES
+from fio_hdr import LogHistogram, histogram_from_counts
+from fio_utils import simply_filename, file_check, time_it, parallel_map, mode_output
+from fio_instrument import instrumented, phase, timed, add_instrument_arguments
+from fiohistogram import histogram
+
+###################################################
+# HISTOGRAM LOGS
+###################################################
+# fio's completion latency histogram logs (log_hist_msec, '*_clat_hist.*.log') hold one row per direction and logging interval:
+# 'time, direction, bs, count_0, ..., count_n' where count_i is the number of IOs completed in the interval with a latency (nsec)
+# in bucket i. fio's buckets are exactly the buckets of a 'fio_hdr.LogHistogram' with 7 bits, grouped into FIO_GROUP_NR
+# (19 in older, 29 in newer fio versions) groups of 64 buckets, and '--log_hist_coarseness' c merges every 2^c buckets into one
+HIST_TIME = 0
+HIST_DIRECTION = 1
+HIST_BLOCK_SIZE = 2
+HIST_BUCKETS = 3
+FIO_PLAT_BITS = 7
+FIO_PLAT_VAL = 1 << (FIO_PLAT_BITS - 1)
+FIO_GROUP_NR = [29, 19]
+MODES = ["hist", "percentiles", "iops"]
+
+def coarseness(buckets):
+    """
+    Returns (group_nr, coarseness) of a histogram log with the given number of buckets per row.
+    """
+    for group_nr in FIO_GROUP_NR:
+        for c in range(FIO_PLAT_BITS):
+            if buckets == (group_nr * FIO_PLAT_VAL) >> c:
+                return (group_nr, c)
+    raise ValueError("unexpected number of histogram buckets per row: {}".format(buckets))
+
+def load_input_for_hist_log(args, filepath):
+    """
+    Loads and parses a histogram log. Returns a 3-tuple of (times, directions, counts) where counts is a [rows, buckets] array of
+    counts in 'LogHistogram' buckets with 7 bits. Coarse buckets are counted in the middle fine bucket they span.
+    """
+    if args.verbose:
+        print("Starting reading input...")
+    log = load_columns(filepath, verbose=args.verbose, cache=args.cache, jobs=args.jobs, summary=False)
+    coarse = log[HIST_BUCKETS:].T
+    (group_nr, c) = coarseness(coarse.shape[1])
+    print("Intervals in file: {} ({} buckets, coarseness {})".format(len(log[HIST_TIME]), coarse.shape[1], c))
+    counts = np.zeros((coarse.shape[0], group_nr * FIO_PLAT_VAL), dtype=np.int64)
+    counts[:, (1 << c) // 2::1 << c] = coarse
+    if args.direction != "all":
+        keep = log[HIST_DIRECTION] == DIRECTION_NAMES.index(args.direction)
+        return (log[HIST_TIME][keep], log[HIST_DIRECTION][keep], counts[keep])
+    return (np.asarray(log[HIST_TIME]), np.asarray(log[HIST_DIRECTION]), counts)
+
+def windows(times, counts, every_nth):
+    """
+    Sums the counts of all rows (and directions) per window of every_nth msec, or per logged timestamp without every_nth.
+    Returns (window end times in msec, window lengths in msec, [windows, buckets] counts).
+    """
+    keys = (times - 1) // every_nth if every_nth else times
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1]) if len(keys) else np.zeros(0, dtype=np.int64)
+    summed = np.add.reduceat(counts[order], starts, axis=0) if len(keys) else counts[:0]
+    if every_nth:
+        ends = (keys[starts] + 1) * every_nth
+        lengths = np.full(len(ends), every_nth)
+    else:
+        ends = keys[starts]
+        lengths = np.diff(np.concatenate([[0], ends]))
+    return (ends, lengths, summed)
+
+def percentiles_over_time(counts, percentiles):
+    """
+    Returns a [percentiles, windows] array of latencies (usec) where every window's percentile is the middle of the bucket holding it.
+    """
+    (lowers, uppers) = LogHistogram(FIO_PLAT_BITS).bucket_bounds(np.arange(counts.shape[1]))
+    middles = (lowers + uppers) / 2 / 1000
+    cumulative = np.cumsum(counts, axis=1)
+    totals = cumulative[:, -1] if counts.shape[1] else np.zeros(len(counts))
+    values = np.full((len(percentiles), len(counts)), np.nan)
+    for (i, p) in enumerate(percentiles):
+        idx = np.argmax(cumulative >= np.maximum(totals * p / 100, 1)[:, None], axis=1)
+        values[i] = np.where(totals > 0, middles[idx], np.nan)
+    return values
+
+def build_hist_graph(args, loaded):
+    """
+    Draws the latency distribution of all intervals of all files like 'fiohistogram.py -m hdr'.
+    """
+    total = LogHistogram(FIO_PLAT_BITS)
+    for (times, directions, counts) in loaded:
+        total.merge(histogram_from_counts(counts.sum(axis=0), FIO_PLAT_BITS))
+    print("Histogram of {} IOs".format(total.total))
+    smin = int(args.min) if args.min else (total.min if total.min else 0) / 1000
+    smax = int(args.max) if args.max else (total.max if total.max else 0) / 1000
+    hist_args = argparse.Namespace(mode="hdr", logtype="lat", bins=args.bins, hist_mode=args.hist_mode, min=args.min, max=args.max,
+                                   xlog=args.xlog, ylog=args.logscale_y, color=False, percentage=False)
+    histogram(hist_args, None, smin, smax, total)
+    plt.title(args.title)
+
+def build_percentiles_graph(args, loaded):
+    fig, ax = plt.subplots()
+    for (filepath, (times, directions, counts)) in zip(args.files, loaded):
+        (ends, lengths, summed) = windows(times, counts, args.every_nth)
+        values = percentiles_over_time(summed, args.percentiles)
+        for (p, y_values) in zip(args.percentiles, values):
+            ax.plot(ends / 1000, y_values, label="{} p{:g}".format(simply_filename(filepath), p))
+    if args.logscale_y:
+        ax.set_yscale('log')
+    else:
+        ax.set_ylim(bottom=0)
+    ax.legend(loc="upper right")
+    ax.set(xlabel="Elapsed time (sec)", ylabel="Latency (usec)", title=args.title)
+    ax.grid()
+
+def build_iops_graph(args, loaded):
+    fig, ax = plt.subplots()
+    for (filepath, (times, directions, counts)) in zip(args.files, loaded):
+        (ends, lengths, summed) = windows(times, counts, args.every_nth)
+        ax.plot(ends / 1000, summed.sum(axis=1) / np.maximum(lengths, 1) * 1000, label=simply_filename(filepath))
+    if args.logscale_y:
+        ax.set_yscale('log')
+    else:
+        ax.set_ylim(bottom=0)
+    ax.legend(loc="upper right")
+    ax.set(xlabel="Elapsed time (sec)", ylabel="IOPS", title=args.title)
+    ax.grid()
+
+def run(args):
+    with instrumented(args):
+        start_time = time.time_ns()
+        for filepath in args.files:
+            file_check(filepath)
+        loaded = time_it(parallel_map, args.verbose, load_input_for_hist_log, [(args, f) for f in args.files], args.jobs, start_tag="", end_tag="Input load time", phase="load")
+        for mode in args.mode:
+            output = args.output if len(args.mode) == 1 else mode_output(args.output, mode)
+            print("Building graph '{}' in mode '{}'".format(output, mode))
+            with phase("render"):
+                if mode == "hist":
+                    build_hist_graph(args, loaded)
+                elif mode == "percentiles":
+                    build_percentiles_graph(args, loaded)
+                else:
+                    build_iops_graph(args, loaded)
+                plt.tight_layout()
+            timed("savefig", plt.savefig, output)
+            plt.close()
+        print("Completed turning histogram log(s) into graphs ({:.3f} sec).".format((time.time_ns() - start_time) / 1E9))
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Builds graphs from fio completion latency histogram logs (log_hist_msec).")
+    parser.add_argument('-f','--files', nargs='+', help="absolute/relative filepaths for '*_clat_hist.*.log' files to parse", required=True)
+    parser.add_argument('-m','--mode', nargs='+', choices=MODES, default=MODES,
+                        help="the graph(s) to build: the latency distribution, latency percentiles over time and IOPS over time. defaults to all")
+    parser.add_argument('-o','--output', help="filepath for the built graph, the mode is appended when building several modes. defaults to 'output-clat.png'",
+                        default="output-clat.png")
+    parser.add_argument('--title', help="the title of the built graph", default="Fio Log Experiment")
+    parser.add_argument('-d','--direction', help="only use the intervals of this direction. defaults to 'all'", default="all", choices=["all"] + DIRECTION_NAMES)
+    parser.add_argument('-q','--percentiles', nargs='+', type=float, default=[50, 99, 99.9], help="percentiles drawn in mode 'percentiles'. defaults to 50 99 99.9")
+    parser.add_argument("--every_nth", type=int, help="sum the intervals of every n msec for modes 'percentiles' and 'iops'. defaults to the logged intervals")
+    parser.add_argument('--bins', type=int, default=100, help="number of bins to distribute values into in mode 'hist'. defaults to 100")
+    parser.add_argument('-hm', '--hist_mode', help="how the histogram represents density in mode 'hist'. defaults to 'pdf'", default="pdf", choices=["pdf","cdf","val"])
+    parser.add_argument('--min', help="specify minimum latency (usec) for the range in mode 'hist'")
+    parser.add_argument('--max', help="specify maximum latency (usec) for the range in mode 'hist'")
+    parser.add_argument('--xlog', help="use a logarithmic x-axis in mode 'hist'", default=False, action='store_true')
+    parser.add_argument('-ylog','--logscale_y',default=False, action='store_true', help="use a logirithm scale instead of a linear scale for the y-axis")
+    parser.add_argument('-j','--jobs', type=int, default=1, help="number of worker processes used to parse files in parallel. defaults to 1")
+    parser.add_argument('--cache',default=False, action='store_true', help="reuse parsed log columns from a cache file stored next to each log (created on first use)")
+    parser.add_argument('-v','--verbose', help="print more information while running script", default=False, action='store_true')
+    add_instrument_arguments(parser)
+    return parser
+
+def main():
+    print("Welcome to FioLogParser - Histogram Logs!")
+    run(build_parser().parse_args())
+
+if __name__ == '__main__':
+    main()
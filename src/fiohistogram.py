@@ -1,50 +1,44 @@
-import re
 import time
 import argparse
-import math
 
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib import colors
 from matplotlib.ticker import PercentFormatter
-from scipy.stats import norm
-from sklearn.neighbors import KernelDensity
-from sklearn.model_selection import GridSearchCV, LeaveOneOut
 
-from line_count import line_count
-from fio_utils import time_it, metric_label
+from fio_reader import load_columns, iter_columns, estimate_file_rows, VALUE
+from fio_seek import time_range, add_time_range_arguments
+from fio_kde import fft_kde, BANDWIDTH_RULES
+from fio_hdr import LogHistogram, load_histogram, DEFAULT_BITS, HDR_SUFFIX
+from fio_utils import time_it, metric_label, parallel_map
+from fio_instrument import instrumented, timed, add_instrument_arguments
 
 def filter_where(arr, k):
     return arr[np.where(arr < k)]
 
-def load(args): 
-    lc = time_it(line_count, args.verbose, args.filepath, start_tag="Reading lines in file...", end_tag="Line Count Time")
-    print("Lines in file: {}".format(lc))
+def load_file(args, filepath):
     load_limit = 1.0 if args.load_limit < 0.0 or args.load_limit > 1.0 else args.load_limit
-    N = int((lc+1) * load_limit)
+    # an uncompressed log is only read up to the share of its lines estimated from its byte length
+    rows = estimate_file_rows(filepath) if load_limit < 1.0 and not time_range(args) else None
+    max_rows = int(rows * load_limit) if rows is not None else None
+    log = load_columns(filepath, verbose=args.verbose, cache=args.cache, jobs=args.jobs, time_range=time_range(args), max_rows=max_rows)
+    lc = len(log[VALUE])
+    if max_rows is None:
+        print("Lines in file: {}".format(lc))
+        N = int(lc * load_limit)
+    else:
+        print("Lines read from file: {} of about {}".format(lc, rows))
+        N = lc
     if args.load_limit:
         print("Loading {} samples...".format(N))
-    values = np.zeros(N)
-    start_time = time.time_ns()
+    # divide by 1000 to go from nsec -> usec, KiB/sec -> MiB/sec or IOPS -> kIOPS 
+    return log[VALUE][:N] / 1000
+
+def load(args): 
     if args.verbose:
         print("Starting parsing input...")
-    with open(args.filepath) as f:
-        line_fraction = int(math.ceil(lc / 1E2))
-        counter = 0
-        time_now = 0
-        for i, line in enumerate(f):
-            if i == N:
-                break
-            log = re.split(", ", line) 
-            # divide by 1000 to go from nsec -> usec, KiB/sec -> MiB/sec or IOPS -> kIOPS 
-            values[i] = int(log[1]) / 1000
-            if(counter % line_fraction == 0):
-                time_now = time.time_ns()
-                print("Progress: {:.0f}% ({:.3f} msec)".format(((counter / lc) * 100), (time_now - start_time) / 1E6),end="\r")
-                start_time = time_now
-            counter += 1
-    print()
+    values = np.concatenate([load_file(args, f) for f in args.filepath])
     if args.verbose:
         print("Finished parsing input. Building graph(s)...")
     if args.outlier_cutoff:
@@ -53,6 +47,43 @@ def load(args):
         print("Reduced dataset by {} with upper cutoff at {}".format(prev_length-len(values),args.outlier_cutoff))
     return values
 
+def load_file_histogram(args, filepath):
+    """
+    Counts the values of a log file block by block into a 'LogHistogram', or loads the histogram if the file is one saved by '--save_hdr'.
+    """
+    if filepath.endswith(HDR_SUFFIX):
+        buckets = load_histogram(filepath)
+        print("Loaded histogram of {} values from '{}'".format(buckets.total, filepath))
+        return buckets
+    buckets = LogHistogram(args.hdr_bits)
+    lc = 0
+    for log in iter_columns(filepath, verbose=args.verbose, cache=args.cache, jobs=args.jobs, time_range=time_range(args)):
+        values = log[VALUE]
+        lc += len(values)
+        if args.outlier_cutoff:
+            values = values[values < int(args.outlier_cutoff) * 1000]
+        buckets.add(values)
+    print("Lines in file: {}".format(lc))
+    return buckets
+
+def load_histograms(args):
+    """
+    Streams every file into a log-bucketed histogram (see 'fio_hdr.LogHistogram') and merges them, so memory does not grow with the number of samples.
+    """
+    if args.verbose:
+        print("Starting parsing input...")
+    if args.load_limit != 1.0:
+        print("warning: '--load_limit' is ignored in 'hdr' mode")
+    jobs = args.jobs if len(args.filepath) > 1 else 1
+    buckets = LogHistogram(args.hdr_bits)
+    for b in parallel_map(load_file_histogram, [(args, f) for f in args.filepath], jobs):
+        buckets.merge(b)
+    print("Histogram of {} samples in {} buckets ({} bytes)".format(buckets.total, np.count_nonzero(buckets.counts), buckets.counts.nbytes))
+    if args.save_hdr:
+        buckets.save(args.save_hdr)
+        print("Saved histogram to '{}'".format(args.save_hdr))
+    return buckets
+
 def color_hist(ax, N, bins, patches): 
     fracs = N / N.max()
     norm = colors.Normalize(fracs.min(), fracs.max())
@@ -88,12 +119,36 @@ def hist(ax, args, sample, smin, smax):
     else: 
         return ax.hist(sample, bins=b, log=args.ylog, range=(smin, smax), label=bin_width(args, smin, smax)) 
 
-def histogram(args, sample, smin, smax):
+def hdr_hist(ax, args, buckets, smin, smax):
+    '''
+    Draws a histogram like 'hist' from the bucket counts of a 'LogHistogram' by spreading every bucket over the bins it overlaps.
+    '''
+    if args.xlog:
+        smin = max(smin, max(buckets.min if buckets.min else 0, 1) / 1000)
+        edges = 10 ** np.linspace(np.log10(smin), np.log10(smax), int(args.bins))
+    else:
+        edges = np.linspace(smin, smax, int(args.bins) + 1)
+    # bucket bounds are in log units, i.e. before dividing by 1000
+    counts = buckets.rebin(edges * 1000)
+    centers = (edges[:-1] + edges[1:]) / 2
+    label = bin_width(args, smin, smax)
+    if args.hist_mode == "cdf":
+        return ax.hist(centers, bins=edges, weights=counts, density=True, cumulative=True, log=args.ylog, label=label)
+    elif args.hist_mode == "pdf":
+        return ax.hist(centers, bins=edges, weights=counts / max(buckets.total, 1), log=args.ylog, label=label)
+    else:
+        return ax.hist(centers, bins=edges, weights=counts, log=args.ylog, label=label)
+
+def histogram(args, sample, smin, smax, buckets=None):
     '''
     The simple mode will focus on representing the sample just as a histogram in order to summarize the density.
+    The 'hdr' mode draws the same histogram from the merged 'LogHistogram' given as buckets instead of the sample.
     '''
     fig, ax = plt.subplots()
-    N, bins, patches = hist(ax, args, sample, smin, smax)
+    if buckets is None:
+        N, bins, patches = hist(ax, args, sample, smin, smax)
+    else:
+        N, bins, patches = hdr_hist(ax, args, buckets, smin, smax)
     if (args.color):
         color_hist(ax, N, bins, patches)
     ax.set(xlabel=metric_label(args.logtype), ylabel=determine_ylabel(args),title="Distribution of measurement values")
@@ -124,6 +179,8 @@ def normal_distribution(args, sample, smin, smax):
 
     if (args.verbose): # define the distribution
         print("Define the distribution...")
+    # scipy and sklearn are only imported by the modes that need them, they take longer to import than the rest of the script
+    from scipy.stats import norm
     dist = norm(sample_mean, sample_std)
 
     if (args.verbose): # sample probabilities for a range of outcomes
@@ -168,16 +225,18 @@ def determine_bandwidth(args, train):
     # determine optimal bandwidth based on training dataset
     if (args.verbose):
         print("Determining optimal bandwidth...")
+    from sklearn.neighbors import KernelDensity
+    from sklearn.model_selection import GridSearchCV
     start_time = time.time_ns()
-    bandwidths = np.linspace(0.0, 5.0, 100, dtype=float)
+    bandwidths = np.linspace(0.05, 5.0, 100, dtype=float)
     grid = GridSearchCV(KernelDensity(kernel=args.kmode, atol=args.absolute_tolerance, rtol=args.relative_tolerance),
                         {'bandwidth': bandwidths})
     train = train.reshape((len(train), 1))
     grid.fit(train)
     end_time = time.time_ns()
     print("Found optimal bandwidth in {:.3f} sec".format((end_time - start_time) / 1E9))
-    print("Optimal bandwidth: {}".format(grid.best_params_.bandwidth))
-    return grid.best_params_.bandwidth
+    print("Optimal bandwidth: {}".format(grid.best_params_["bandwidth"]))
+    return grid.best_params_["bandwidth"]
 
 def split(args, sample):
     '''
@@ -198,8 +257,12 @@ def split(args, sample):
 
 def calc_density(args, sample, smin, smax):
     """
-    Train a Kernel Density Estimation model using sample data and produce probabilities in appropriate range
+    Estimates the density of the sample and returns (values, probabilities) for a range of outcomes.
+    The 'fft' engine bins the full sample, see 'fio_kde.fft_kde', while the 'sklearn' engine trains a Kernel Density Estimation model.
     """
+    if args.kde_engine == "fft":
+        return calc_binned_density(args, sample, smin, smax)
+    from sklearn.neighbors import KernelDensity
     # split dataset into training, validation and test datasets
     train, validate = split(args, sample)
     start_time = time.time_ns()
@@ -208,7 +271,7 @@ def calc_density(args, sample, smin, smax):
     if (args.verbose):
         print("Training kernel density model...")
     validate = validate.reshape((len(validate), 1))
-    model = KernelDensity(bandwidth=args.kernel_bandwidth, kernel=args.kmode, atol=args.absolute_tolerance, rtol=args.relative_tolerance)
+    model = KernelDensity(bandwidth=bw, kernel=args.kmode, atol=args.absolute_tolerance, rtol=args.relative_tolerance)
     model = model.fit(validate)
     print("Total training time: {:.3f} sec".format((time.time_ns() - start_time) / 1E9))
     if (args.verbose):
@@ -226,11 +289,28 @@ def calc_density(args, sample, smin, smax):
     print("Total sampling time: {:.3f} sec".format((time.time_ns() - start_time) / 1E9))
     return (test, probabilities)
 
-def kernel_density(args, sample, smin, smax):
+def calc_binned_density(args, sample, smin, smax):
     """
-    Processes input using Kernel Density Estimation and plots the pdf (propability density function) along with the histogram
+    Estimates the density of the full sample on a fine grid by FFT convolution and samples it for a range of outcomes.
+    The bandwidth is '--kernel_bandwidth' if given, otherwise chosen by '--bandwidth_rule'.
     """
-    (values, probabilities) = time_it(calc_density, args.verbose, args, sample, smin, smax, start_tag="", end_tag="Kernel density estimation time")
+    if (args.verbose):
+        print("Estimating density of {} samples on a grid of {} points...".format(len(sample), args.grid_size))
+    start_time = time.time_ns()
+    (grid, density, bw) = fft_kde(sample, smin, smax, kernel=args.kmode, bw=args.kernel_bandwidth, rule=args.bandwidth_rule, size=args.grid_size)
+    print("Bandwidth: {} ({})".format(bw, "given" if args.kernel_bandwidth else args.bandwidth_rule))
+    print("Total estimation time: {:.3f} sec".format((time.time_ns() - start_time) / 1E9))
+    test = np.linspace(smin, smax, 1000, dtype=float)
+    return (test, np.interp(test, grid, density))
+
+def kernel_density(args, sample, smin, smax, density=None):
+    """
+    Processes input using Kernel Density Estimation and plots the pdf (propability density function) along with the histogram.
+    The (values, probabilities) of 'calc_density' are estimated unless given as density.
+    """
+    if density is None:
+        density = time_it(calc_density, args.verbose, args, sample, smin, smax, start_tag="", end_tag="Kernel density estimation time", phase="aggregate")
+    (values, probabilities) = density
     
     if (args.verbose): # plotting histogram and pdf
         print("Plotting histogram and pdf...")
@@ -263,46 +343,68 @@ def run(args):
     4. output temporal measurements of execution
     5. output results either directly to file or in a new window 
     '''
-    start_time = time.time_ns()
-    # load and parse input
-    sample = time_it(load,args.verbose, args, end_tag="File loading time")
+    with instrumented(args):
+        start_time = time.time_ns()
+        if args.mode == "hdr":
+            buckets = time_it(load_histograms, args.verbose, args, end_tag="File loading time", phase="load")
+            sample_min = int(args.min) if args.min else (buckets.min if buckets.min else 0) / 1000
+            sample_max = int(args.max) if args.max and not args.outlier_cutoff else (buckets.max if buckets.max else 0) / 1000 if not args.outlier_cutoff else int(args.outlier_cutoff)
+            if (args.verbose):
+                print("Min value: {}, Max value: {}".format(sample_min, sample_max))
+            timed("render", histogram, args, None, sample_min, sample_max, buckets)
+            finish(args, start_time)
+            return
+
+        # load and parse input
+        sample = time_it(load,args.verbose, args, end_tag="File loading time", phase="load")
     
-    # calculate min and max values of sample data
-    sample_min = int(args.min) if args.min else np.min(sample)
-    sample_max = int(args.max) if args.max and not args.outlier_cutoff else np.max(sample) if not args.outlier_cutoff else int(args.outlier_cutoff)
-    if (args.verbose):
-        print("Min value: {}, Max value: {}".format(sample_min, sample_max))
+        # calculate min and max values of sample data
+        sample_min = int(args.min) if args.min else np.min(sample)
+        sample_max = int(args.max) if args.max and not args.outlier_cutoff else np.max(sample) if not args.outlier_cutoff else int(args.outlier_cutoff)
+        if (args.verbose):
+            print("Min value: {}, Max value: {}".format(sample_min, sample_max))
 
-    # process sample depending on mode
-    if(args.mode == "normal"):
-        normal_distribution(args, sample, sample_min, sample_max)
-    elif(args.mode == "kernel"):
-        kernel_density(args, sample, sample_min, sample_max)
-    else:
-        histogram(args,sample, sample_min, sample_max)
-        
+        # process sample depending on mode
+        if(args.mode == "normal"):
+            timed("render", normal_distribution, args, sample, sample_min, sample_max)
+        elif(args.mode == "kernel"):
+            density = time_it(calc_density, args.verbose, args, sample, sample_min, sample_max, start_tag="", end_tag="Kernel density estimation time", phase="aggregate")
+            timed("render", kernel_density, args, sample, sample_min, sample_max, density)
+        else:
+            timed("render", histogram, args,sample, sample_min, sample_max)
+        finish(args, start_time)
+
+def finish(args, start_time):
+    '''
+    Outputs the runtime and writes the graph to file or shows it in a new window.
+    '''
     print("Completed turning log file(s) into graph ({:.3f} sec).".format((time.time_ns() - start_time) / 1E9))
     if(args.windowed):
         plt.show()
     else:
-        plt.savefig(args.output)
+        timed("savefig", plt.savefig, args.output)
     plt.close()
 
-def main():
+def build_parser():
     '''
-    The main function handles specifying how the program can be executed including which arguments are required and optional for running the program. 
+    Returns the argument parser which specifies how the program can be executed including which arguments are required and optional for running the program. 
     See below for a full list or use '-h' or '--help' for more information about each argument.
     '''
     parser = argparse.ArgumentParser()
     # required arguments
-    parser.add_argument('-f','--filepath', help='absolute/relative filepaths for file to parse', required=True)
-    parser.add_argument('-m','--mode', help="histogram mode used for parsing and building graphs", 
-                        choices=["simple","normal", "kernel"], required=True)
+    parser.add_argument('-f','--filepath', help="absolute/relative filepaths for files to parse. the samples of several files are combined. "
+                        "in 'hdr' mode a histogram saved with '--save_hdr' ('*{}') can be given instead of a log file".format(HDR_SUFFIX), nargs='+', required=True)
+    parser.add_argument('-m','--mode', help="histogram mode used for parsing and building graphs. 'hdr' builds the simple histogram from log-bucketed counts "
+                        "filled while streaming the files instead of holding every sample", choices=["simple","normal", "kernel", "hdr"], required=True)
     parser.add_argument('-lt','--logtype', help="the type for values in files", 
                         default="bw", choices=["bw","lat","iops"],required=True)
 
     # optional arguments - general
     parser.add_argument('-v','--verbose', help="print more information while running script", default=False, action='store_true')
+    parser.add_argument('-j','--jobs', help="number of worker processes used to parse byte ranges of a large log in parallel. defaults to 1", default=1, type=int)
+    parser.add_argument('--cache', help="reuse parsed log columns from a cache file stored next to the log (created on first use)", default=False, action='store_true')
+    add_instrument_arguments(parser)
+    add_time_range_arguments(parser)
 
     parser.add_argument('-w','--windowed', help="instead of writing to file then show in window", default=False, action='store_true')
     parser.add_argument('-o','--output', help="filepath for the built graph. defaults to 'output-hist.png'", default="output-hist.png")
@@ -314,14 +416,26 @@ def main():
     parser.add_argument('--min', help="specify minimum data value for range")
     parser.add_argument('--max', help="specify maximum data value for range.")
     parser.add_argument('-c','--outlier_cutoff', help="specify a maximum value so only a range (0-value) of measurements are processed further.")
-    parser.add_argument('-ll','--load_limit', help="limits the amount of data to be loaded in for processing. provide as decimal percentage. defaults to 1.", default=1.0, type=float)
+    parser.add_argument('-ll','--load_limit', help="limits the amount of data to be loaded in for processing. provide as decimal percentage. "
+                        "an uncompressed log is only read up to the share of its lines estimated from its size. defaults to 1.", default=1.0, type=float)
     
+    # optional arguments - hdr mode
+    parser.add_argument('--hdr_bits', help="number of significant bits kept per value in 'hdr' mode. values are binned with a relative error "
+                        "below 2^-(bits-1). defaults to {}".format(DEFAULT_BITS), default=DEFAULT_BITS, type=int)
+    parser.add_argument('--save_hdr', help="in 'hdr' mode then save the merged histogram to this filepath (should end with '{}') so it can be merged "
+                        "with other histograms later".format(HDR_SUFFIX))
+
     # optional arguments - normal mode
     parser.add_argument('--show_means', help="in 'normal' mode then show the calculated mean and standard deviation on generated graph", default=False, action='store_true')
 
     # optional arguments - kernel mode
+    parser.add_argument('--kde_engine', help="'fft' estimates the density of the full sample on a binned grid, 'sklearn' trains a KernelDensity model "
+                        "with a bandwidth found by grid search. defaults to 'fft'", choices=["fft", "sklearn"], default="fft")
+    parser.add_argument('-bwr', '--bandwidth_rule', help="how the 'fft' engine chooses the kernel bandwidth: Scott's or Silverman's rule of thumb, "
+                        "the Sheather-Jones plug-in ('sj') or least-squares cross-validation ('cv'). defaults to 'sj'", choices=BANDWIDTH_RULES, default="sj")
+    parser.add_argument('--grid_size', help="number of grid points for the 'fft' engine. defaults to 16384", default=16384, type=int)
     parser.add_argument('--training_split', help="how large a fraction that the training data should be out of total dataset. defaults to 0.5, i.e. 50%", default=0.5, type=float)
-    parser.add_argument('-kbw', '--kernel_bandwidth', help="set kernel bandwidth. note that setting this value has the consequence that training dataset is ignored.", type=float)
+    parser.add_argument('-kbw', '--kernel_bandwidth', help="set kernel bandwidth. note that setting this value has the consequence that training dataset and '--bandwidth_rule' are ignored.", type=float)
     parser.add_argument('--kmode', help="decide what kernel density estimation method to use. defaults to 'gaussian'", 
                         choices=["gaussian", "tophat", "epanechnikov"], default="gaussian")
     parser.add_argument('-atol','--absolute_tolerance', help="specify the absolute tolerance for kernel estimation. defaults to '0.0'", default=0.0, type=float)
@@ -332,11 +446,16 @@ def main():
     parser.add_argument('--xlog', help="use a logarithmic x-axis. disabled by default.", default=False, action='store_true')
     parser.add_argument('--color', help="color the histogram according to height. disabled by default.", default=False, action='store_true')
     parser.add_argument('--percentage', help="represent probability density by percentage instead of decimal. disabled by default.", default=False, action='store_true')
+    return parser
 
+def main():
+    '''
+    The main function parses the arguments given on the command line and runs the program, see 'build_parser' and 'run'.
+    '''
     # prints introduction and measure runtime
-    args = parser.parse_args()
+    args = build_parser().parse_args()
     print("Welcome to FioLogParser - Histograms!")
-    print("Building graph '{}' in mode '{}' from '{}'".format(args.output, args.mode, args.filepath))
+    print("Building graph '{}' in mode '{}' from '{}'".format(args.output, args.mode, ", ".join(args.filepath)))
     run(args)
 
 if __name__ == '__main__':
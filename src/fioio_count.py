@@ -1,29 +1,41 @@
 import sys
-import re
-import time
-import math
 
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 
-from line_count import line_count
-from fio_utils import metric_label, combine, simply_filename, file_check, time_it
+from fio_reader import iter_columns, TIME, DIRECTION
+from fio_seek import time_range
+from fio_records import DIRECTION_NAMES
+from fio_instrument import phase, timed
+from fio_utils import simply_filename, aggregated_label, file_check, time_it, parallel_map
+from fio_aggregate import IoWindows, aggregate_files
 
 ###################################################
 # IO COUNT MODE
 ###################################################
-def build_io_count_graph(args, ax, results):
-    for (y_values, x_values) in results:
-        if args.graphtype == "errorbar":
-            print("errorbar not supported for this mode")
-            sys.exit()
-        elif args.graphtype == "bar":
-            ax.bar(x_values, y_values, width=0.05)
-        elif args.graphtype == "line":
-            ax.plot(x_values, y_values)
+def build_io_count_graph(args, ax, results, names):
+    """
+    Draws the IOPS of every result and returns the legend labels of the drawn series. With '--rw_split' every
+    direction that has IOs is drawn as its own series.
+    """
+    labels = []
+    for name, (y_values, x_values) in zip(names, results):
+        if y_values.ndim == 1:
+            series = [(name, y_values)]
         else:
-            ax.scatter(x_values, y_values, s=10)
+            series = [("{} ({})".format(name, DIRECTION_NAMES[d]), y) for (d, y) in enumerate(y_values) if y.any()]
+        for (label, y_values) in series:
+            if args.graphtype == "errorbar":
+                print("errorbar not supported for this mode")
+                sys.exit()
+            elif args.graphtype == "bar":
+                ax.bar(x_values, y_values, width=0.05)
+            elif args.graphtype == "line":
+                ax.plot(x_values, y_values)
+            else:
+                ax.scatter(x_values, y_values, s=10)
+            labels.append(label)
         if args.logscale_y:
             ax.set_yscale('log')
         else:
@@ -31,57 +43,86 @@ def build_io_count_graph(args, ax, results):
                 ax.set_ylim(bottom=0, top=args.axisalign)
             else:
                 ax.set_ylim(bottom=0)
+    return labels
 
-def build_io_count_graphs(args):
+def build_io_count_graphs(args, loaded=None):
+    """
+    Builds the graph from the results of 'load_input_for_io_count' per file which are loaded if not given.
+    With '-agg' the IOs of all files are counted into the same windows instead and loaded holds their single result.
+    """
     fig, ax = plt.subplots()
-    results = np.empty(len(args.files), dtype=object)
-    for i in range(len(args.files)):
-        filepath = args.files[i]
-        file_check(filepath)
-        results[i] = time_it(load_input_for_io_count, args.verbose, args, filepath, start_tag="", end_tag="Input load time")
-    build_io_count_graph(args, ax, combine(results) if args.aggregate_files else results)
-    if args.aggregate_files:
-        ax.legend([", ".join([simply_filename(f) for f in args.files]) if len(args.files) < 3 else "aggregated files"], loc="upper right")
-    else: 
-        ax.legend([simply_filename(f) for f in args.files], loc="upper right")
-    ax.set(xlabel="Elapsed time (sec)",
-           ylabel="IOPS",
-           title=args.title)
-    ax.grid()
-    plt.tight_layout()
-    fig.savefig(args.output)
+    if loaded is None:
+        for filepath in args.files:
+            file_check(filepath)
+        if args.aggregate_files:
+            loaded = [time_it(aggregate_files, args.verbose, args, load_windows_for_io_count, start_tag="", end_tag="Input load time", phase="load").result()]
+        else:
+            loaded = time_it(parallel_map, args.verbose, load_input_for_io_count, [(args, f) for f in args.files], args.jobs, start_tag="", end_tag="Input load time", phase="load")
+    with phase("render"):
+        names = [aggregated_label(args.files)] if args.aggregate_files else [simply_filename(f) for f in args.files]
+        labels = build_io_count_graph(args, ax, [in_time_range(args, result) for result in loaded], names)
+        ax.legend(labels, loc="upper right")
+        ax.set(xlabel="Elapsed time (sec)",
+               ylabel="IOPS",
+               title=args.title)
+        ax.grid()
+        plt.tight_layout()
+    timed("savefig", fig.savefig, args.output)
     plt.close()
 
+def in_time_range(args, result):
+    """
+    Returns the windows of the result that lie within '--from_ms' and '--to_ms'. A window that straddles either end only
+    counts the part of its IOs within the range, which would show up as a dip in the IOPS, so it is left out too.
+    """
+    (y_values, x_values) = result
+    if time_range(args) is None:
+        return result
+    (start, end) = time_range(args)
+    # window ends in msec, a window holds the IOs with a timestamp in (end - window_ms, end]
+    ends = np.rint(x_values * 1000).astype(np.int64)
+    keep = np.ones(len(ends), dtype=bool)
+    if start is not None:
+        keep &= ends - args.window_ms + 1 >= start
+    if end is not None:
+        keep &= ends <= end
+    return (y_values[..., keep], x_values[keep])
+
 def load_input_for_io_count(args, filepath):
-    lc = time_it(line_count, args.verbose, filepath, start_tag="Reading lines in file...", end_tag="Line Count Time") + 1
-    print("Lines in file: {}".format(lc))
-    start_time = time.time_ns()
-    y_values = np.zeros([lc])
-    x_values = np.arange(1,lc)
-    k = 0
+    """
+    Returns the result of 'count_ios' for the log at the given filepath.
+    """
+    return load_windows_for_io_count(args, filepath).result()
+
+def load_windows_for_io_count(args, filepath):
+    """
+    Returns the 'IoWindows' of the log at the given filepath, which is counted block by block.
+    """
     if args.verbose:
         print("Starting reading input...")
-    ThousandCounter = 1000
-    with open(filepath) as f:        
-        line_fraction = int(math.ceil(lc / 1E2))
-        last = 0
-        count = 0
-        for i, line in enumerate(f):
-            log = re.split(", ", line)
-            nextTime = (int(log[0]))
-            if(nextTime <= ThousandCounter):
-                count +=1
-            elif(nextTime > ThousandCounter):
-                y_values[k] = count
-                count = 0
-                ThousandCounter += 1000
-                k += 1
-            if(i % line_fraction == 0):
-                time_now = time.time_ns()
-                print("Progress: {:.0f}% ({:.3f} msec)".format(((i / lc) * 100), (time_now - start_time) / 1E6),end="\r")
-                start_time = time_now
-        if count > 0:
-            y_values[k] = count
-            k += 1
-    print()
-    return (y_values[:k], x_values[:k])
\ No newline at end of file
+    windows = new_io_windows(args)
+    lc = 0
+    for log in iter_columns(filepath, verbose=args.verbose, cache=args.cache, jobs=args.jobs, time_range=time_range(args)):
+        timed("aggregate", windows.add, log[TIME], log[DIRECTION])
+        lc += log.shape[1]
+    print("Lines in file: {}".format(lc))
+    return windows
+
+def new_io_windows(args):
+    """
+    Returns empty 'IoWindows' of '--window_ms' that start every '--slide_ms', split by direction with '--rw_split'.
+    """
+    return IoWindows(args.window_ms, args.slide_ms, args.rw_split)
+
+def io_windows(args, log):
+    """
+    Returns the 'IoWindows' of an already parsed log.
+    """
+    return new_io_windows(args).add(log[TIME], log[DIRECTION])
+
+def count_ios(args, log):
+    """
+    Returns (y_values, x_values) of the parsed log where y_values are the IOPS of every window of '--window_ms' (per direction
+    with '--rw_split') and x_values the end of every window in sec, see 'IoWindows'.
+    """
+    return io_windows(args, log).result()
@@ -1,34 +1,53 @@
 import sys
-import re
-import time
-import math
 
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 
-from line_count import line_count
-from fio_utils import metric_label, simply_filename, file_check, time_it
+from fio_reader import load_columns, iter_columns, TIME, VALUE
+from fio_seek import time_range
+from fio_records import scaled
+from fio_instrument import phase, timed
+from fio_utils import metric_label, simply_filename, aggregated_label, file_check, time_it, parallel_map
+from fio_aggregate import TimeBuckets, aggregate_files
+from fio_plot import decimate, density
 
 ###################################################
 # IOS MODE
 ###################################################
-def build_count_graphs(args):
+def build_count_graphs(args, results=None):
+    """
+    Builds the graph from the results of 'load_input_for_count' per file which are loaded if not given.
+    With '-agg' the values of all files are aligned on time buckets of '--window_ms' instead and results holds their single
+    result, see 'aggregated_values'.
+    """
     ylabel = metric_label(args.logtype)
     fig, ax = plt.subplots()
-    for i in range(len(args.files)):
-        filepath = args.files[i]
-        file_check(filepath)
-        (y_values, x_values) = time_it(load_input_for_count, args.verbose, args, filepath, start_tag="",end_tag="Input load time")
-        if args.graphtype == "errorbar":
-            print("errorbar not supported for this mode")
-            sys.exit()
-        elif args.graphtype == "bar":
-            ax.bar(x_values, y_values, width=0.05)
-        elif args.graphtype == "line":
-            ax.plot(x_values, y_values)
+    labels = [aggregated_label(args.files)] if args.aggregate_files else [simply_filename(f) for f in args.files]
+    if results is None:
+        for filepath in args.files:
+            file_check(filepath)
+        if args.aggregate_files:
+            results = [aggregated_values(args, time_it(aggregate_files, args.verbose, args, load_buckets_for_count, start_tag="", end_tag="Input load time", phase="load"))]
         else:
-            ax.scatter(x_values, y_values, s=10)
+            results = time_it(parallel_map, args.verbose, load_input_for_count, [(args, f) for f in args.files], args.jobs, start_tag="",end_tag="Input load time", phase="load")
+    with phase("render"):
+        if args.graphtype == "density":
+            # a single density grid counts the IOs of all files together
+            density(args, fig, ax, np.concatenate([r[1] for r in results]), scaled(np.concatenate([r[0] for r in results])), aggregated_label(args.files))
+        else:
+            for label, (y_values, x_values) in zip(labels, results):
+                (x_values, y_values) = decimate(args, fig, x_values, y_values, label)
+                y_values = scaled(y_values)
+                if args.graphtype == "errorbar":
+                    print("errorbar not supported for this mode")
+                    sys.exit()
+                elif args.graphtype == "bar":
+                    ax.bar(x_values, y_values, width=0.05)
+                elif args.graphtype == "line":
+                    ax.plot(x_values, y_values)
+                else:
+                    ax.scatter(x_values, y_values, s=10)
         if args.logscale_y:
             ax.set_yscale('log')
             ax.set_ylim(bottom=1)
@@ -36,32 +55,61 @@ def build_count_graphs(args):
             ax.set_ylim(bottom=0)
         if(args.axisalign):
             ax.set_ylim(top=args.axisalign)
-                
-    ax.legend([simply_filename(f) for f in args.files], loc="upper right")
-    ax.set(xlabel="IO Number (counted by log entries)",ylabel=ylabel,title=args.title)
-    ax.grid()
+                    
+        if args.graphtype != "density":
+            ax.legend(labels, loc="upper right")
+        xlabel = "Elapsed time (sec)" if args.aggregate_files else "IO Number (counted by log entries)"
+        ax.set(xlabel=xlabel,ylabel=ylabel,title=args.title)
+        ax.grid()
     # plt.tight_layout()
-    fig.savefig(args.output)
+    timed("savefig", fig.savefig, args.output)
     plt.close()
 
 def load_input_for_count(args, filepath):
-    lc = time_it(line_count, args.verbose, filepath, start_tag="Reading lines in file...", end_tag="Line Count Time") + 1
-    print("Lines in file: {}".format(lc))
-    start_time = time.time_ns()
-    y_values = np.zeros([lc])
-    x_values = np.arange(lc)
-    k = 0
     if args.verbose:
         print("Starting reading input...")
-    with open(filepath) as f:        
-        line_fraction = int(math.ceil(lc / 1E2))
-        for i, line in enumerate(f):
-            log = re.split(", ", line)
-            y_values[k] = int(log[1]) / 1000
-            k += 1
-            if(i % line_fraction == 0):
-                time_now = time.time_ns()
-                print("Progress: {:.0f}% ({:.3f} msec)".format(((i / lc) * 100), (time_now - start_time) / 1E6),end="\r")
-                start_time = time_now
-    print()
-    return (y_values[:k], x_values[:k])
\ No newline at end of file
+    log = load_columns(filepath, verbose=args.verbose, cache=args.cache, jobs=args.jobs, time_range=time_range(args))
+    print("Lines in file: {}".format(len(log[VALUE])))
+    return timed("aggregate", count_values, log)
+
+def count_values(log):
+    """
+    Returns (y_values, x_values) of the parsed log where y_values are the raw measurement values and x_values the IO numbers.
+    """
+    y_values = log[VALUE]
+    x_values = np.arange(len(y_values), dtype=np.int32 if len(y_values) < 2**31 else np.int64)
+    return (y_values, x_values)
+
+def load_buckets_for_count(args, filepath):
+    """
+    Returns the 'TimeBuckets' of '--window_ms' that hold the values of the log at the given filepath, which is added block by block.
+    """
+    if args.verbose:
+        print("Starting reading input...")
+    buckets = TimeBuckets(args.window_ms)
+    lc = 0
+    for log in iter_columns(filepath, verbose=args.verbose, cache=args.cache, jobs=args.jobs, time_range=time_range(args)):
+        timed("aggregate", buckets.add, log[TIME], log[VALUE])
+        lc += log.shape[1]
+    print("Lines in file: {}".format(lc))
+    return file_buckets(args, buckets)
+
+def value_buckets(args, log):
+    """
+    Returns the 'TimeBuckets' of '--window_ms' that hold the values of an already parsed log.
+    """
+    return file_buckets(args, TimeBuckets(args.window_ms).add(log[TIME], log[VALUE]))
+
+def file_buckets(args, buckets):
+    # bandwidth and IOPS of several files (jobs) add up while their latencies are averaged, so the bandwidth or IOPS of
+    # every file is reduced to its mean per bucket before the files are merged
+    return buckets if args.logtype == "lat" else buckets.averaged()
+
+def aggregated_values(args, buckets):
+    """
+    Returns (y_values, x_values) of the buckets that hold values, where x_values are the bucket ends in sec and y_values the
+    raw mean latency of all entries in the bucket, or the sum of the mean bandwidth or IOPS of every file.
+    """
+    used = buckets.used()
+    y_values = buckets.means() if args.logtype == "lat" else buckets.sums[:buckets.size]
+    return (y_values[used], buckets.ends()[used] / 1000)
@@ -1,52 +1,108 @@
+import sys
 import time
 import argparse
 
-from fioelapsed import build_elapsed_graphs
-from fioios import build_count_graphs
-from fioio_count import build_io_count_graphs
-from fiomixed import build_mixed_read_write_graphs
+from fio_instrument import instrumented, add_instrument_arguments
+from fio_seek import add_time_range_arguments
 
 ###################################################
 # MAIN METHOD & ARGUMENTS
 ###################################################
-def main():
-    """ 
-    FioLogParser will generate a plot from a fio log file. This file is to be used as a unifying interface to a class of python scripts 
-    such as fioio_count, fioios, fioelapsed and fiohistogram. 
+# modes that can be re-built from a growing log with '--follow'
+FOLLOW_MODES = ["elapsed", "io_count"]
+# modes that can draw the 'density' graphtype
+DENSITY_MODES = ["ios", "mixed"]
+
+def build_parser():
+    """
+    Returns the argument parser for FioLogParser. See below for a full list or use '-h' or '--help' for more information about each argument.
     """
-    print("Welcome to FioLogParser!")
     parser = argparse.ArgumentParser()
-    parser.add_argument('-m','--mode', help="the mode used for parsing and building graphs", 
-                        choices=["elapsed", "ios","io_count", "mixed"], required=True)
+    parser.add_argument('-m','--mode', nargs='+', help="the mode(s) used for parsing and building graphs. several modes are built from a single parse of each file", 
+                        choices=["elapsed", "ios","io_count", "mixed", "hist"], required=True)
     parser.add_argument('-lt','--logtype', help="the type for values in files", 
                         default="bw", choices=["bw","lat","iops"],required=True)
     parser.add_argument('-f','--files', nargs='+', help='absolute/relative filepaths for files to parse', required=True)
     parser.add_argument('-o','--output', help="filepath for the built graph. defaults to 'output.png'", default="output.png")
     parser.add_argument('--title', help="the title of the built graph", default="Fio Log Experiment")
     parser.add_argument('-v','--verbose', help="print more information while running script", default=False, action='store_true')
+    parser.add_argument('-j','--jobs', type=int, default=1, help="number of worker processes used to parse files, or byte ranges of a single large file, in parallel. defaults to 1")
+    parser.add_argument('--cache',default=False, action='store_true', help="reuse parsed log columns from a cache file stored next to each log (created on first use)")
     parser.add_argument("--every_nth", type=int, default=1,
                         help="iterate over n values. used for mode 'elapsed' and 'io_count'. defaults to 1")
     parser.add_argument('--same_time',default=False, action='store_true', help="specify that iterations should occur based on time")
     parser.add_argument('-ylog','--logscale_y',default=False, action='store_true', help="use a logirithm scale instead of a linear scale for the y-axis")
-    parser.add_argument('-agg','--aggregate_files',default=False, action='store_true', help="aggregate results from multiple logs into a single data set")
+    parser.add_argument('-agg','--aggregate_files',default=False, action='store_true', help="aggregate results from multiple logs into a single data set aligned on elapsed time. used for mode 'elapsed', 'ios' and 'io_count'")
+    parser.add_argument('--window_ms', type=int, default=1000, help="width in msec of the windows IOs are counted in for mode 'io_count' (shown as IOPS), "
+                        "and of the time buckets that align the logs for '-agg' in mode 'ios'. defaults to 1000")
+    parser.add_argument('--slide_ms', type=int, help="start an 'io_count' window every this many msec, so that windows of '--window_ms' overlap like a sliding window. "
+                        "'--window_ms' must be a multiple of it. defaults to '--window_ms'")
+    parser.add_argument('--percentiles', nargs='*', type=float, help="also draw these percentiles of every '--every_nth' window, e.g. '--percentiles 50 99 99.9'. "
+                        "without values p50, p99 and p99.9 are drawn. used for mode 'elapsed'")
+    parser.add_argument('--rw_split',default=False, action='store_true', help="count the IOPS of reads, writes and trims as separate series. used for mode 'io_count'")
     parser.add_argument('-gt','--graphtype', help="the type of graph to be built. defaults to a mode-specific default", 
-                        default="default", choices=["default","bar","line","dots","errorbar"])
+                        default="default", choices=["default","bar","line","dots","errorbar","density"])
     parser.add_argument('-aa','--axisalign', help="a single number determining the max value across log files in order to align the axis",
                         type=int)
+    parser.add_argument('--decimate',default=False, action='store_true', help="reduce each series to about '--target_points' points while keeping spikes visible. used for mode 'ios' and 'mixed'")
+    parser.add_argument('--target_points', type=int, help="number of points kept per series by '--decimate'. defaults to twice the pixel width of the graph")
+    parser.add_argument('--density_log',default=False, action='store_true', help="use a logarithmic color scale for the 'density' graphtype")
+    parser.add_argument('--follow',default=False, action='store_true', help="keep re-building the graph from the lines appended to the logs while fio is running. "
+                        "used for mode 'elapsed' and 'io_count'")
+    parser.add_argument('--refresh', type=float, default=10, help="seconds between refreshes with '--follow'. defaults to 10")
+    parser.add_argument('--idle_exit', type=float, help="stop '--follow' after this many seconds without new lines. defaults to following until interrupted")
+    parser.add_argument('--bins', type=int, default=100, help="number of bins to distribute values into. used for mode 'hist'. defaults to 100")
+    return add_time_range_arguments(add_instrument_arguments(parser))
 
-    args = parser.parse_args()
+def run(args):
+    """
+    Builds the graph(s) of the parsed arguments in the requested mode(s).
+    """
     start_time = time.time_ns()
 
-    print("Building graph '{}' in mode '{}' as a '{}' graph from '{}' log file(s)".format(args.output, args.mode, args.graphtype, args.logtype))
-    if args.mode == "elapsed":
-        build_elapsed_graphs(args)
-    elif args.mode == "ios":
-        build_count_graphs(args)
-    elif args.mode == "io_count":
-        build_io_count_graphs(args)
-    elif args.mode == "mixed":
-        build_mixed_read_write_graphs(args)
+    print("Building graph '{}' in mode '{}' as a '{}' graph from '{}' log file(s)".format(args.output, " ".join(args.mode), args.graphtype, args.logtype))
+    if args.slide_ms and args.window_ms % args.slide_ms != 0:
+        print("--window_ms {} is not a multiple of --slide_ms {}".format(args.window_ms, args.slide_ms))
+        sys.exit()
+    if args.percentiles and not all(0 <= p <= 100 for p in args.percentiles):
+        print("--percentiles must be between 0 and 100")
+        sys.exit()
+    if args.graphtype == "density" and any(m not in DENSITY_MODES for m in args.mode):
+        print("density graph not supported for mode '{}'".format(" ".join(m for m in args.mode if m not in DENSITY_MODES)))
+        sys.exit()
+    with instrumented(args):
+        # every mode only imports the modules it needs to keep the startup of one-off runs short
+        if args.follow:
+            if len(args.mode) > 1 or args.mode[0] not in FOLLOW_MODES:
+                print("--follow is only supported for a single mode out of: {}".format(", ".join(FOLLOW_MODES)))
+                sys.exit()
+            from fiofollow import follow_graphs
+            follow_graphs(args)
+        elif len(args.mode) > 1 or args.mode[0] == "hist":
+            from fiofused import build_fused_graphs
+            build_fused_graphs(args)
+        elif args.mode[0] == "elapsed":
+            from fioelapsed import build_elapsed_graphs
+            build_elapsed_graphs(args)
+        elif args.mode[0] == "ios":
+            from fioios import build_count_graphs
+            build_count_graphs(args)
+        elif args.mode[0] == "io_count":
+            from fioio_count import build_io_count_graphs
+            build_io_count_graphs(args)
+        elif args.mode[0] == "mixed":
+            from fiomixed import build_mixed_read_write_graphs
+            build_mixed_read_write_graphs(args)
     print("Completed turning log file(s) into graphs ({:.3f} sec).".format((time.time_ns() - start_time) / 1E9))
 
+def main():
+    """ 
+    FioLogParser will generate a plot from a fio log file. This file is to be used as a unifying interface to a class of python scripts 
+    such as fioio_count, fioios, fioelapsed and fiohistogram. 
+    """
+    print("Welcome to FioLogParser!")
+    args = build_parser().parse_args()
+    run(args)
+
 if __name__ == '__main__':
     main()
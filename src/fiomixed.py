@@ -1,88 +1,104 @@
+import os
 import sys
-import re
-import time
-import math
 
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 
-from line_count import line_count
-from fio_utils import metric_label, simply_filename, file_check, time_it
+from fio_reader import load_columns, VALUE, DIRECTION
+from fio_seek import time_range
+from fio_records import scaled, direction_index, READ, WRITE
+from fio_instrument import phase, timed
+from fio_utils import metric_label, simply_filename, file_check, time_it, parallel_map
+from fio_plot import decimate, density
 
 
 ###################################################
 # MIXED MODE
 ###################################################
-def build_mixed_read_write_graphs(args):
+def build_mixed_read_write_graphs(args, results=None):
+    """
+    Builds the read and write graphs from the results of 'load_input_for_count' per file which are loaded if not given.
+    """
     ylabel = metric_label(args.logtype)
-    for i in range(len(args.files)):
-        filepath = args.files[i]
-        file_check(filepath)
-        (reads, writes, x_values) = time_it(load_input_for_count, args.verbose, args, filepath, start_tag="",end_tag="Input load time")
-        build_graph(args, x_values, reads, filepath, mode="reads")
-        build_graph(args, x_values, writes, filepath, mode="writes")
+    if results is None:
+        for filepath in args.files:
+            file_check(filepath)
+        results = time_it(parallel_map, args.verbose, load_input_for_count, [(args, f) for f in args.files], args.jobs, start_tag="",end_tag="Input load time", phase="load")
+    for filepath, (reads, writes, io_count) in zip(args.files, results):
+        build_graph(args, *reads, io_count, filepath, mode="reads")
+        build_graph(args, *writes, io_count, filepath, mode="writes")
 
 def empty_check(array):
-    return len(array) == 0 or all(value == 0 or np.isnan(value) for value in array)
+    return len(array) == 0 or bool(np.all((array == 0) | np.isnan(array)))
 
-def build_graph(args, x_values, y_values, filepath, mode="reads"):
-    # do not build graph if either result set are empty
-    if (empty_check(x_values) or empty_check(y_values)): 
+def mixed_output(output, mode):
+    """
+    Returns the output filepath with the mode ('reads' or 'writes') put in front of the filename, e.g. 'graphs/reads-output.png'.
+    """
+    (folder, filename) = os.path.split(output)
+    return os.path.join(folder, mode+"-"+filename)
+
+def build_graph(args, x_values, y_values, io_count, filepath, mode="reads"):
+    """
+    Draws the raw values y_values of the IOs numbered x_values out of io_count IOs in total.
+    """
+    # do not build graph if the result set is empty
+    if empty_check(y_values): 
         print("warning: {} do not contain any values, skipping graph build".format(mode))
         return
     ylabel = metric_label(args.logtype)
     fig, ax = plt.subplots()
-    if args.graphtype == "errorbar":
-        print("errorbar not supported for this mode")
-        sys.exit()
-    elif args.graphtype == "bar":
-        ax.bar(x_values, y_values, width=0.05)
-    elif args.graphtype == "line":
-        ax.plot(x_values, y_values)
-    else:
-        ax.scatter(x_values, y_values, s=10)
-    if args.logscale_y:
-        ax.set_yscale('log')
-        ax.set_ylim(bottom=1)
-    else:
-        ax.set_ylim(bottom=0)
-    if(args.axisalign):
-        ax.set_ylim(top=args.axisalign)
-
-    ax.set_xlim(left=0, right=len(x_values))        
     legend=mode+"-"+simply_filename(filepath)
-    ax.legend([legend], loc="upper right")
-    ax.set(xlabel="IO Number (counted by log entries)",ylabel=ylabel,title=args.title)
-    ax.grid()
+    with phase("render"):
+        if args.graphtype != "density":
+            (x_values, y_values) = decimate(args, fig, x_values, y_values, legend)
+        y_values = scaled(y_values)
+        if args.graphtype == "density":
+            density(args, fig, ax, x_values, y_values, legend)
+        elif args.graphtype == "errorbar":
+            print("errorbar not supported for this mode")
+            sys.exit()
+        elif args.graphtype == "bar":
+            ax.bar(x_values, y_values, width=0.05)
+        elif args.graphtype == "line":
+            if not args.decimate:
+                # break the line where IOs of the other direction are, as it is not drawn across them
+                breaks = np.flatnonzero(np.diff(x_values) > 1) + 1
+                (x_values, y_values) = (np.insert(x_values.astype(float), breaks, np.nan), np.insert(y_values, breaks, np.nan))
+            ax.plot(x_values, y_values)
+        else:
+            ax.scatter(x_values, y_values, s=10)
+        if args.logscale_y:
+            ax.set_yscale('log')
+            ax.set_ylim(bottom=1)
+        else:
+            ax.set_ylim(bottom=0)
+        if(args.axisalign):
+            ax.set_ylim(top=args.axisalign)
+
+        ax.set_xlim(left=0, right=io_count)        
+        if args.graphtype != "density":
+            ax.legend([legend], loc="upper right")
+        ax.set(xlabel="IO Number (counted by log entries)",ylabel=ylabel,title=args.title)
+        ax.grid()
     # plt.tight_layout()
-    fig.savefig(mode+"-"+args.output)
+    timed("savefig", fig.savefig, mixed_output(args.output, mode))
     plt.close()
 
 def load_input_for_count(args, filepath):
-    lc = time_it(line_count, args.verbose, filepath, start_tag="Reading lines in file...", end_tag="Line Count Time") + 1
-    print("Lines in file: {}".format(lc))
-    start_time = time.time_ns()
-    x_values = np.arange(lc)
-    reads = np.zeros([lc])
-    writes = np.zeros([lc])
-    k = 0
     if args.verbose:
         print("Starting reading input...")
-    with open(filepath) as f:        
-        line_fraction = int(math.ceil(lc / 1E2))
-        for i, line in enumerate(f):
-            log = re.split(", ", line)
-            if int(log[2]) == 0:
-                reads[k] = int(log[1]) / 1000
-                writes[k] = np.NaN
-            elif int(log[2]) == 1:
-                writes[k] = int(log[1]) / 1000
-                reads[k] = np.NaN
-            k += 1
-            if(i % line_fraction == 0):
-                time_now = time.time_ns()
-                print("Progress: {:.0f}% ({:.3f} msec)".format(((i / lc) * 100), (time_now - start_time) / 1E6),end="\r")
-                start_time = time_now
-    print()
-    return (reads[:k], writes[:k], x_values[:k])
\ No newline at end of file
+    log = load_columns(filepath, verbose=args.verbose, cache=args.cache, jobs=args.jobs, time_range=time_range(args))
+    print("Lines in file: {}".format(len(log[VALUE])))
+    return timed("aggregate", split_read_write, log)
+
+def split_read_write(log):
+    """
+    Returns (reads, writes, io_count) of the parsed log where reads and writes are (x_values, y_values) of the read and write IOs
+    respectively: their IO numbers and their raw measurement values. io_count is the number of IOs in the log.
+    """
+    values = log[VALUE]
+    reads = direction_index(log[DIRECTION], READ)
+    writes = direction_index(log[DIRECTION], WRITE)
+    return ((reads, values[reads]), (writes, values[writes]), len(values))
\ No newline at end of file
@@ -0,0 +1,153 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import contextlib
+
+import numpy as np
+
+from fio_reader import iter_columns, VALUE, DIRECTION
+from fio_records import direction_name
+from fio_hdr import LogHistogram, DEFAULT_BITS
+from fio_compress import find_logs
+from fio_utils import metric_label, file_check, parallel_map
+
+###################################################
+# PERCENTILE REPORT
+###################################################
+# percentiles are read from a 'fio_hdr.LogHistogram' per file and direction: its buckets are at most 2^-(bits-1) wide relative
+# to their lower bound and the reported value lies in the bucket that holds the exact percentile, so the reported value is within
+# a relative error of 2^-(bits-1) (0.78% for 8 bits) of the exact one. memory only depends on the bits and the largest value
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9, 99.99]
+ALL = "all"
+
+def find_files(paths, pattern):
+    """
+    Returns the log files given by paths where every folder is replaced by its (possibly compressed) log files matching the pattern.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += find_logs(path, pattern)
+        else:
+            files.append(path)
+    return files
+
+def sketch_file(args, filepath):
+    """
+    Streams the log block by block into one histogram per direction. Returns a dict of direction -> LogHistogram.
+    """
+    sketches = {}
+    for log in iter_columns(filepath, verbose=args.verbose, progress=args.verbose, cache=args.cache, jobs=args.jobs):
+        directions = log[DIRECTION]
+        for direction in np.unique(directions):
+            if direction not in sketches:
+                sketches[int(direction)] = LogHistogram(args.bits)
+            sketches[int(direction)].add(log[VALUE][directions == direction])
+    return sketches
+
+def merged(sketches, bits):
+    total = LogHistogram(bits)
+    for sketch in sketches:
+        total.merge(sketch)
+    return total
+
+def report_row(name, direction, sketch, percentiles):
+    # divide by 1000 to go from nsec -> usec, KiB/sec -> MiB/sec or IOPS -> kIOPS
+    row = {"file": name, "direction": direction, "count": sketch.total,
+           "min": sketch.min / 1000 if sketch.min is not None else None,
+           "max": sketch.max / 1000 if sketch.max is not None else None}
+    for p in percentiles:
+        row[percentile_name(p)] = sketch.quantile(p / 100) / 1000 if sketch.total else None
+    return row
+
+def percentile_name(p):
+    return "p{:g}".format(p)
+
+def build_report(args, files, results):
+    """
+    Returns the report rows: every direction and all directions per file, followed by the same across all files.
+    """
+    rows = []
+    totals = {}
+    for (filepath, sketches) in zip(files, results):
+        for direction in sorted(sketches):
+            rows.append(report_row(filepath, direction_name(direction), sketches[direction], args.percentiles))
+            totals.setdefault(direction, []).append(sketches[direction])
+        rows.append(report_row(filepath, ALL, merged(sketches.values(), args.bits), args.percentiles))
+    if len(files) > 1:
+        for direction in sorted(totals):
+            rows.append(report_row(ALL, direction_name(direction), merged(totals[direction], args.bits), args.percentiles))
+        rows.append(report_row(ALL, ALL, merged([s for t in totals.values() for s in t], args.bits), args.percentiles))
+    return rows
+
+def format_value(value):
+    return "-" if value is None else "{:.3f}".format(value)
+
+def write_table(out, rows, columns, unit):
+    width = max([len(r["file"]) for r in rows] + [4])
+    print("Values in {}".format(unit), file=out)
+    print("{:<{}} {:<9} {:>10}".format("File", width, "Direction", "Count") + "".join(["{:>12}".format(c) for c in columns]), file=out)
+    for r in rows:
+        print("{:<{}} {:<9} {:>10}".format(r["file"], width, r["direction"], r["count"]) + "".join(["{:>12}".format(format_value(r[c])) for c in columns]), file=out)
+
+def write_csv(out, rows, columns, unit):
+    writer = csv.DictWriter(out, fieldnames=["file", "direction", "count"] + columns)
+    writer.writeheader()
+    writer.writerows(rows)
+
+def write_json(out, rows, columns, unit):
+    json.dump({"unit": unit, "rows": rows}, out, indent=2)
+    out.write("\n")
+
+WRITERS = {"table": write_table, "csv": write_csv, "json": write_json}
+
+def run(args):
+    start_time = time.time_ns()
+    files = find_files(args.files, args.pattern.format(logtype=args.logtype))
+    if not files:
+        print("No log files found. Exiting...")
+        return
+    # status messages go to stderr while the report itself is printed to stdout
+    with contextlib.redirect_stdout(sys.stdout if args.output else sys.stderr):
+        for filepath in files:
+            file_check(filepath)
+        # the pool is spread over the files, a single large file is split into byte ranges instead
+        jobs = args.jobs if len(files) > 1 else 1
+        results = parallel_map(sketch_file, [(args, f) for f in files], jobs)
+    rows = build_report(args, files, results)
+    columns = ["min"] + [percentile_name(p) for p in args.percentiles] + ["max"]
+    writer = WRITERS[args.format]
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            writer(out, rows, columns, metric_label(args.logtype))
+        print("Wrote percentiles of {} log file(s) to '{}'".format(len(files), args.output))
+    else:
+        writer(sys.stdout, rows, columns, metric_label(args.logtype))
+    if args.verbose:
+        print("Completed report in {:.3f} sec".format((time.time_ns() - start_time) / 1E9))
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Reports tail percentiles of the measurement values per log file, per direction and across all files.")
+    parser.add_argument('-f','--files', nargs='+', required=True, help="log files and/or folders containing log files")
+    parser.add_argument('-lt','--logtype', help="the type for values in files. defaults to 'lat'", default="lat", choices=["bw","lat","iops"])
+    parser.add_argument('-p','--pattern', help="filename pattern for log files in folders, '{logtype}' is replaced by the log type. defaults to '*_{logtype}.*.log'",
+                        default="*_{logtype}.*.log")
+    parser.add_argument('-q','--percentiles', nargs='+', type=float, default=DEFAULT_PERCENTILES,
+                        help="percentiles to report. defaults to {}".format(" ".join(["{:g}".format(p) for p in DEFAULT_PERCENTILES])))
+    parser.add_argument('--format', help="output format. defaults to 'table'", default="table", choices=list(WRITERS))
+    parser.add_argument('-o','--output', help="write the report to this filepath instead of printing it")
+    parser.add_argument('--bits', help="significant bits kept per value, the reported percentiles are within a relative error of 2^-(bits-1). "
+                        "defaults to {}".format(DEFAULT_BITS), default=DEFAULT_BITS, type=int)
+    parser.add_argument('-j','--jobs', help="number of worker processes used to parse the files in parallel. defaults to 1", default=1, type=int)
+    parser.add_argument('--cache', help="reuse parsed log columns from a cache file stored next to the log (created on first use)", default=False, action='store_true')
+    parser.add_argument('-v','--verbose', help="print more information while running script", default=False, action='store_true')
+    return parser
+
+def main():
+    run(build_parser().parse_args())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import importlib
+import threading
+import traceback
+import contextlib
+import socketserver
+import multiprocessing
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+from fioclient import socket_path, TOOLS
+
+###################################################
+# RENDER SERVER
+###################################################
+# a long-lived process that keeps numpy, matplotlib and the tools imported and runs the argument sets it receives as jobs,
+# so a run does not pay the interpreter startup and import cost of a new process. see fioclient.py for the protocol
+# the modes of fiologparser.py, which it only imports once a run asks for them
+MODE_MODULES = ["fioelapsed", "fioios", "fioio_count", "fiomixed", "fiofused", "fiofollow"]
+WARM_MODULES = ["scipy.stats", "scipy.optimize", "sklearn.neighbors", "sklearn.model_selection"]
+
+def warm_up(full=True):
+    """
+    Imports the tools with their modes, draws a throwaway figure so the first job does not pay for setting up matplotlib
+    (backend and fonts) and, if full, imports the libraries that some modes only import when they need them.
+    """
+    for module in TOOLS + MODE_MODULES:
+        importlib.import_module(module)
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [0, 1])
+    ax.set(xlabel="x", ylabel="y", title="warm up")
+    fig.canvas.draw()
+    plt.close(fig)
+    if full:
+        for module in WARM_MODULES:
+            importlib.import_module(module)
+
+def exit_status(code):
+    return code if isinstance(code, int) else (0 if code is None else 1)
+
+def run_job(argv, cwd):
+    """
+    Runs a tool with the given arguments in the given working directory and returns the response for the client
+    with everything the tool printed as output.
+    """
+    start_time = time.time_ns()
+    output = io.StringIO()
+    status = 0
+    server_cwd = os.getcwd()
+    try:
+        os.chdir(cwd)
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            if not argv or argv[0] not in TOOLS:
+                raise ValueError("unknown tool '{}', expected one of: {}".format(argv[0] if argv else "", ", ".join(TOOLS)))
+            tool = importlib.import_module(argv[0])
+            parser = tool.build_parser()
+            parser.prog = argv[0] + ".py"
+            tool.run(parser.parse_args(argv[1:]))
+    except SystemExit as e:
+        status = exit_status(e.code)
+    except Exception:
+        output.write(traceback.format_exc())
+        status = 1
+    finally:
+        plt.close("all")
+        os.chdir(server_cwd)
+    return {"status": status, "output": output.getvalue(), "seconds": (time.time_ns() - start_time) / 1E9}
+
+class RenderServer:
+    """
+    Runs jobs in this process, or with jobs > 1 in a pool of that many worker processes forked after warming up.
+    """
+    def __init__(self, jobs=1, verbose=False):
+        self.pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+        self.verbose = verbose
+        self.completed = 0
+
+    def handle(self, request):
+        """
+        Returns the response to the request, or None for a stop command.
+        """
+        if request.get("command") == "stop":
+            return None
+        if self.pool:
+            response = self.pool.apply(run_job, (request.get("argv", []), request.get("cwd", os.getcwd())))
+        else:
+            response = run_job(request.get("argv", []), request.get("cwd", os.getcwd()))
+        self.completed += 1
+        if self.verbose:
+            print("Job {}: '{}' finished with status {} in {:.3f} sec".format(self.completed, " ".join(request.get("argv", [])), response["status"], response["seconds"]),
+                  file=sys.stderr)
+        return response
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
+            self.pool.join()
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            response = self.server.render.handle(json.loads(line))
+            if response is None:
+                self.wfile.write((json.dumps({"status": 0, "output": "Render server stopping\n", "seconds": 0}) + "\n").encode())
+                # shutdown waits for serve_forever to return, so it has to be called from another thread
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve_socket(render, path, jobs):
+    """
+    Serves jobs on the Unix socket until a client sends a stop command. With several workers connections are handled concurrently.
+    """
+    if os.path.exists(path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            try:
+                s.connect(path)
+                print("A render server is already listening on '{}'. Exiting...".format(path))
+                return
+            except OSError:
+                os.remove(path)
+    server_class = ThreadingUnixServer if jobs > 1 else socketserver.UnixStreamServer
+    with server_class(path, JobHandler) as server:
+        server.render = render
+        print("Render server listening on '{}' with {} worker(s)".format(path, jobs))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
+    print("Render server stopped after {} job(s)".format(render.completed))
+
+def serve_stdio(render):
+    """
+    Serves jobs read as JSON lines from stdin and writes the responses as JSON lines to stdout until stdin is closed.
+    """
+    out = sys.stdout
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        response = render.handle(json.loads(line))
+        if response is None:
+            break
+        out.write(json.dumps(response) + "\n")
+        out.flush()
+
+def run(args):
+    start_time = time.time_ns()
+    warm_up(full=not args.light)
+    print("Loaded libraries in {:.3f} sec".format((time.time_ns() - start_time) / 1E9), file=sys.stderr if args.stdio else sys.stdout)
+    render = RenderServer(args.jobs, args.verbose)
+    try:
+        if args.stdio:
+            serve_stdio(render)
+        else:
+            serve_socket(render, args.socket, args.jobs)
+    finally:
+        render.close()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Keeps the FioLogParser tools and their libraries loaded and runs the jobs sent by fioclient.py.")
+    parser.add_argument('--socket', help="the Unix socket to listen on. defaults to $FIO_SERVER_SOCKET or a socket per user in the temp folder", default=socket_path())
+    parser.add_argument('--stdio', default=False, action='store_true', help="read jobs as JSON lines from stdin and write the responses to stdout instead of using a socket")
+    parser.add_argument('-j','--jobs', type=int, default=1, help="number of worker processes running jobs concurrently. defaults to 1")
+    parser.add_argument('--light', default=False, action='store_true', help="do not pre-load scipy and sklearn, which only the 'normal' and 'kernel' histogram modes use")
+    parser.add_argument('-v','--verbose', help="print every finished job", default=False, action='store_true')
+    return parser
+
+def main():
+    run(build_parser().parse_args())
+
+if __name__ == '__main__':
+    main()
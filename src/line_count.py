@@ -2,9 +2,10 @@ import sys
 import os
 import time
 from fio_utils import file_check
+from fio_compress import open_log
 
 def line_count(filepath): 
-    with open(filepath) as f:
+    with open_log(filepath) as (f, raw):
         i = -1
         for i, l in enumerate(f):
             pass
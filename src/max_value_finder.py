@@ -1,121 +1,154 @@
 import sys
 import os
-import re
 import time
 import math
 import argparse
 
-from fio_utils import file_check
-
-def find_max_from_files(files, verbose=False): 
-    currentMaxValue = 0
-    for i in range(len(files)):
-        filepath = files[i]
-        start_time=time.time_ns()
-        if verbose:
-            print("Processing {}...".format(filepath))
-        with open(filepath) as f:
-            for i, line in enumerate(f):
-                nextLatencyArray = re.split(", ", line)
-                nextLatency = (int(nextLatencyArray[1])) / 1000
-                if(nextLatency > currentMaxValue):
-                    currentMaxValue = nextLatency
-        if verbose:
-            print("Processed {} in {:.3f} sec.".format(filepath,(time.time_ns() - start_time) / 1E9))
-    return int(math.ceil(currentMaxValue))
-
-def find_iopsmax(files, verbose=False):
-    maxNumberOfTraces = 0
-    for i in range(len(files)):
-        filepath = files[i]
-        start_time=time.time_ns()
-        if verbose:
-            print("Processing {}...".format(filepath))
-        ThousandCounter = 1000
-        with open(filepath) as f:
-            numberOfTraces = 0
-            for i, line in enumerate(f):
-                nextLineArray = re.split(", ", line)
-                nextTime = (int(nextLineArray[0]))
-                if(nextTime <= ThousandCounter):
-                    numberOfTraces +=1
-                elif(nextTime > ThousandCounter):
-                    if(numberOfTraces > maxNumberOfTraces):
-                        maxNumberOfTraces = numberOfTraces
-                    numberOfTraces = 0
-                    ThousandCounter += 1000
-            if(numberOfTraces > maxNumberOfTraces):
-                maxNumberOfTraces = numberOfTraces
-                    
-        if verbose:
-            print("Processed {} in {:.3f} sec.".format(filepath,(time.time_ns() - start_time) / 1E9))
-    return int(math.ceil(maxNumberOfTraces))
-
-def find_max_and_iops(files, verbose=False):
-    maxNumberOfTraces = 0
-    currentMaxValue = 0
-    for i in range(len(files)):
-        filepath = files[i]
-        start_time=time.time_ns()
-        if verbose:
-            print("Processing {}...".format(filepath))
-        ThousandCounter = 1000
-        with open(filepath) as f:
-            numberOfTraces = 0
-            for i, line in enumerate(f):
-                nextLineArray = re.split(", ", line)
-                nextLatency = (int(nextLineArray[1])) / 1000
-                nextTime = (int(nextLineArray[0]))
-                if(nextTime <= ThousandCounter):
-                    numberOfTraces +=1
-                elif(nextTime > ThousandCounter):
-                    if(numberOfTraces > maxNumberOfTraces):
-                        maxNumberOfTraces = numberOfTraces
-                    numberOfTraces = 0
-                    ThousandCounter += 1000
-                if(nextLatency > currentMaxValue):
-                    currentMaxValue = nextLatency
-            if(numberOfTraces > maxNumberOfTraces):
-                maxNumberOfTraces = numberOfTraces
-        if verbose:
-            print("Processed {} in {:.3f} sec.".format(filepath,(time.time_ns() - start_time) / 1E9))
-                    
+from fio_reader import iter_columns, TIME, VALUE
+from fio_utils import file_check, parallel_map
+from fio_instrument import instrumented, timed, add_instrument_arguments
+from fio_aggregate import IoWindows
+from fio_summary import load_summary
+
+def max_iops(times, window=1000, step=None):
+    """
+    Returns the highest number of IOs per second within a single window of window msec (starting every step msec), counted
+    by the same 'IoWindows' as mode 'io_count'.
+    """
+    return IoWindows(window, step).add(times).max_iops()
+
+def max_value(values):
+    """
+    Returns the highest measurement value divided by 1000 or 0 if there are no values.
+    """
+    return values.max() / 1000 if len(values) > 0 else 0
+
+def processed(filepath, start_time, verbose=False):
+    if verbose:
+        print("Processed {} in {:.3f} sec.".format(filepath,(time.time_ns() - start_time) / 1E9))
+
+def scan_log(filepath, verbose=False, cache=False, jobs=1, window=1000, step=None, summary=True):
+    """
+    Returns (max value, max IOPS) of the log, see 'max_value' and 'max_iops'. The log is streamed block by block
+    (see 'fio_reader.iter_columns'), so a scan only holds a block and the IO counts of the windows at a time.
+    """
+    if verbose:
+        print("Processing {}...".format(filepath))
+    highest = 0
+    windows = IoWindows(window, step)
+    for log in iter_columns(filepath, verbose=verbose, progress=verbose, cache=cache, jobs=jobs, summary=summary):
+        highest = max(highest, timed("aggregate", max_value, log[VALUE]))
+        timed("aggregate", windows.add, log[TIME])
+    return (highest, windows.max_iops())
+
+def file_max(filepath, verbose=False, cache=False, jobs=1):
+    start_time=time.time_ns()
+    (nextLatency, numberOfTraces) = scan_log(filepath, verbose=verbose, cache=cache, jobs=jobs)
+    processed(filepath, start_time, verbose=verbose)
+    return nextLatency
+
+def file_iopsmax(filepath, verbose=False, cache=False, jobs=1, window=1000, step=None):
+    start_time=time.time_ns()
+    (nextLatency, numberOfTraces) = scan_log(filepath, verbose=verbose, cache=cache, jobs=jobs, window=window, step=step)
+    processed(filepath, start_time, verbose=verbose)
+    return numberOfTraces
+
+def file_max_and_iops(filepath, verbose=False, cache=False, jobs=1, window=1000, step=None):
+    start_time=time.time_ns()
+    maxes = scan_log(filepath, verbose=verbose, cache=cache, jobs=jobs, window=window, step=step)
+    processed(filepath, start_time, verbose=verbose)
+    return maxes
+
+def summaries(files, verbose=False, window=1000, step=None):
+    """
+    Returns the summary of every file that has an up to date one (see 'fio_summary') and None for the files that need a
+    scan. The summary holds the max IOPS of windows of 1000 msec, so other windows always scan the files.
+    """
+    if window != 1000 or (step and step != window):
+        return [None for f in files]
+    found = [load_summary(f) for f in files]
+    if verbose:
+        for (f, summary) in zip(files, found):
+            if summary is not None:
+                print("Using summary of {}".format(f))
+    return found
+
+def summary_max_value(summary):
+    return summary["max"] / 1000 if summary["max"] is not None else 0
+
+def scanned(process, files, found, arguments, jobs):
+    """
+    Returns the outputs of process for the files without a summary, scanned in parallel, in the order of files.
+    """
+    missing = [f for (f, summary) in zip(files, found) if summary is None]
+    return iter(parallel_map(process, [(f,) + arguments for f in missing], jobs))
+
+def find_max_from_files(files, verbose=False, cache=False, jobs=1):
+    found = summaries(files, verbose)
+    scans = scanned(file_max, files, found, (verbose, cache, jobs), jobs)
+    maxValues = [summary_max_value(s) if s is not None else next(scans) for s in found]
+    return int(math.ceil(max(maxValues, default=0)))
+
+def find_iopsmax(files, verbose=False, cache=False, jobs=1, window=1000, step=None):
+    found = summaries(files, verbose, window, step)
+    scans = scanned(file_iopsmax, files, found, (verbose, cache, jobs, window, step), jobs)
+    maxTraces = [s["max_iops"] if s is not None else next(scans) for s in found]
+    return int(math.ceil(max(maxTraces, default=0)))
+
+def find_max_and_iops(files, verbose=False, cache=False, jobs=1, window=1000, step=None):
+    found = summaries(files, verbose, window, step)
+    scans = scanned(file_max_and_iops, files, found, (verbose, cache, jobs, window, step), jobs)
+    maxes = [(summary_max_value(s), s["max_iops"]) if s is not None else next(scans) for s in found]
+    currentMaxValue = max([m[0] for m in maxes], default=0)
+    maxNumberOfTraces = max([m[1] for m in maxes], default=0)
     return (int(math.ceil(currentMaxValue)), int(math.ceil(maxNumberOfTraces)))
 
-def main():
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('-f','--files', nargs='+', help='absolute/relative filepaths for files to parse', required=True)
     parser.add_argument('-m','--mode', help="the mode of operation determines if the maximum value, the maxium iops value or both should be produced by the run. defaults to 'max'", 
                         default="max", choices=["max","iops","both"])
     parser.add_argument('-v', '--verbose',  action='store_true', help='print more information')
-    args = parser.parse_args()
-
-    maxValue = 0
-    maxTraces = 0
-    start_time = time.time_ns()
-    if args.mode == "max":
-        maxValue = find_max_from_files(args.files, verbose=args.verbose)
-        if args.verbose:
-            print("Max value found across '{}' files was '{}'".format(len(args.files), maxValue))
-            print("Found max value in {:.3f} sec.".format((time.time_ns() - start_time) / 1E9))
-        else:
-            print(maxValue)
-    elif args.mode == "iops":
-        maxTraces = find_iopsmax(args.files, verbose=args.verbose)
-        if args.verbose:
-            print("Max IOPS value found across '{}' files was '{}'".format(len(args.files), maxTraces))
-            print("Found max IOPS value in {:.3f} sec.".format((time.time_ns() - start_time) / 1E9))
-        else:
-            print(maxValue)
-    else:
-        (maxValue, maxTraces) = find_max_and_iops(args.files, verbose=args.verbose)
-        if args.verbose:
-            print("Max value found across '{}' files was '{}'".format(len(args.files), maxValue))
-            print("Max IOPS value found across '{}' files was '{}'".format(len(args.files), maxTraces))
-            print("Found max values in {:.3f} sec.".format((time.time_ns() - start_time) / 1E9))
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes used to scan files, or byte ranges of a single large file, in parallel. defaults to 1')
+    parser.add_argument('--cache', action='store_true', help='reuse parsed log columns from a cache file stored next to each log (created on first use)')
+    parser.add_argument('--window_ms', type=int, default=1000, help="width in msec of the windows IOs are counted in for the max IOPS. defaults to 1000")
+    parser.add_argument('--slide_ms', type=int, help="start a window every this many msec, so that windows of '--window_ms' overlap like a sliding window. "
+                        "'--window_ms' must be a multiple of it. defaults to '--window_ms'")
+    return add_instrument_arguments(parser)
+
+def run(args):
+    if args.slide_ms and args.window_ms % args.slide_ms != 0:
+        print("--window_ms {} is not a multiple of --slide_ms {}".format(args.window_ms, args.slide_ms))
+        sys.exit()
+    with instrumented(args):
+        maxValue = 0
+        maxTraces = 0
+        start_time = time.time_ns()
+        if args.mode == "max":
+            maxValue = find_max_from_files(args.files, verbose=args.verbose, cache=args.cache, jobs=args.jobs)
+            if args.verbose:
+                print("Max value found across '{}' files was '{}'".format(len(args.files), maxValue))
+                print("Found max value in {:.3f} sec.".format((time.time_ns() - start_time) / 1E9))
+            else:
+                print(maxValue)
+        elif args.mode == "iops":
+            maxTraces = find_iopsmax(args.files, verbose=args.verbose, cache=args.cache, jobs=args.jobs, window=args.window_ms, step=args.slide_ms)
+            if args.verbose:
+                print("Max IOPS value found across '{}' files was '{}'".format(len(args.files), maxTraces))
+                print("Found max IOPS value in {:.3f} sec.".format((time.time_ns() - start_time) / 1E9))
+            else:
+                print(maxTraces)
         else:
-            print("{} {}".format(maxValue, maxTraces))
+            (maxValue, maxTraces) = find_max_and_iops(args.files, verbose=args.verbose, cache=args.cache, jobs=args.jobs, window=args.window_ms, step=args.slide_ms)
+            if args.verbose:
+                print("Max value found across '{}' files was '{}'".format(len(args.files), maxValue))
+                print("Max IOPS value found across '{}' files was '{}'".format(len(args.files), maxTraces))
+                print("Found max values in {:.3f} sec.".format((time.time_ns() - start_time) / 1E9))
+            else:
+                print("{} {}".format(maxValue, maxTraces))
+
+def main():
+    run(build_parser().parse_args())
 
-    
 if __name__ == '__main__':
     main()
\ No newline at end of file
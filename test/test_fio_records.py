@@ -0,0 +1,27 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from fio_records import compact_dtype, ColumnBuffer, OFFSET
+
+def test_compact_dtype_boundaries():
+    for (bits, dtype, wider) in [(7, np.int8, np.int16), (15, np.int16, np.int32), (31, np.int32, np.int64)]:
+        top = 2**bits
+        assert compact_dtype(np.array([0, top - 1]), np.int8) == dtype
+        assert compact_dtype(np.array([-top, 0]), np.int8) == dtype
+        assert compact_dtype(np.array([0, top]), np.int8) == wider
+        assert compact_dtype(np.array([-top - 1, 0]), np.int8) == wider
+
+def test_compact_dtype_floor():
+    assert compact_dtype(np.array([0]), np.int8) == np.int8
+    assert compact_dtype(np.array([0]), np.int32) == np.int32
+    assert compact_dtype(np.zeros(0, dtype=np.int64), np.int16) == np.int16
+
+def test_column_buffer_keeps_large_offsets():
+    buffer = ColumnBuffer(OFFSET, 4)
+    buffer.append(np.array([1, 2**31]))
+    buffer.append(np.array([2**31 - 1]))
+    assert buffer.finish(3).tolist() == [1, 2**31, 2**31 - 1]